@@ -1,5 +1,6 @@
+from dataclasses import dataclass
 from pydantic_settings import BaseSettings
-from pydantic import SecretStr
+from pydantic import Field, SecretStr
 from typing import Optional
 
 
@@ -8,20 +9,90 @@ class Settings(BaseSettings):
     BOT_TOKEN: SecretStr
 
     # AI Provider
+    AI_PROVIDER: str = "openai"  # "openai" или "deepseek"
     OPENAI_API_KEY: SecretStr
     OPENAI_BASE_URL: Optional[str] = None  # For DeepSeek or other compatible APIs
+    DEEPSEEK_API_KEY: Optional[SecretStr] = None
     AI_MODEL: str = "gpt-4o-mini"
+    # Лимиты на вызовы LLM: подбираются под tier аккаунта провайдера.
+    # Ноль запрещён: TokenBucket делит на ёмкость, а Semaphore(0) не пустит никого.
+    LLM_MAX_CONCURRENCY: int = Field(8, ge=1)
+    LLM_RPM: int = Field(500, ge=1)
+    LLM_TPM: int = Field(200_000, ge=1)
 
     # Database
     DB_NAME: str = "finance_bot.sqlite"
+    # Например postgresql+asyncpg://...; иначе SQLite по DB_NAME.
+    DATABASE_URL: Optional[str] = None
+    # Пул соединений: дефолты подобраны под файловый SQLite, для Postgres
+    # увеличить (например 20/40, pre_ping, recycle=1800).
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 0
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_RECYCLE: int = -1
+    DB_USE_NULL_POOL: bool = False  # Пул держит PgBouncer, а не приложение
     
     # Logging
     LOG_LEVEL: str = "INFO"
 
+    # Tracing (Phoenix / OpenTelemetry)
+    ENABLE_TRACING: bool = False
+    TRACING_ENDPOINT: str = "http://localhost:6006/v1/traces"
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
-settings = Settings()
+# AICODE-NOTE: Pydantic-модель нужна только для чтения и валидации .env;
+# дальше код работает с неизменяемым снимком на слотах, чтобы настройки нельзя
+# было случайно поменять в рантайме. Новое поле Settings добавлять и сюда —
+# расхождение ловит _check_frozen_fields при импорте.
+@dataclass(frozen=True, slots=True)
+class FrozenSettings:
+    BOT_TOKEN: SecretStr
+
+    AI_PROVIDER: str
+    OPENAI_API_KEY: SecretStr
+    OPENAI_BASE_URL: Optional[str]
+    DEEPSEEK_API_KEY: Optional[SecretStr]
+    AI_MODEL: str
+    LLM_MAX_CONCURRENCY: int
+    LLM_RPM: int
+    LLM_TPM: int
+
+    DB_NAME: str
+    DATABASE_URL: Optional[str]
+    DB_POOL_SIZE: int
+    DB_MAX_OVERFLOW: int
+    DB_POOL_PRE_PING: bool
+    DB_POOL_RECYCLE: int
+    DB_USE_NULL_POOL: bool
+
+    LOG_LEVEL: str
+
+    ENABLE_TRACING: bool
+    TRACING_ENDPOINT: str
+
+
+def _check_frozen_fields(frozen_cls: type, settings_cls: type[BaseSettings]) -> None:
+    """Падает при импорте, если поля FrozenSettings разошлись с Settings."""
+    frozen_fields = frozen_cls.__dataclass_fields__.keys()
+    settings_fields = settings_cls.model_fields.keys()
+    if frozen_fields != settings_fields:
+        raise TypeError(
+            f"{frozen_cls.__name__} должен повторять поля {settings_cls.__name__}: "
+            f"нет в {frozen_cls.__name__}: "
+            f"{sorted(settings_fields - frozen_fields) or '-'}, "
+            f"лишние: {sorted(frozen_fields - settings_fields) or '-'}"
+        )
+
+
+_check_frozen_fields(FrozenSettings, Settings)
+
+
+def load_settings() -> FrozenSettings:
+    return FrozenSettings(**dict(Settings()))
+
 
+settings = load_settings()
@@ -0,0 +1,35 @@
+from typing import Optional
+
+import httpx
+
+# AICODE-NOTE: Один httpx.AsyncClient на процесс для всех AsyncOpenAI-клиентов
+# (чат и Whisper): общий пул keep-alive соединений и HTTP/2, чтобы не платить
+# за TLS-рукопожатие на каждый запрос к провайдеру.
+HTTP_LIMITS = httpx.Limits(
+    max_connections=200,
+    max_keepalive_connections=200,
+    keepalive_expiry=60,
+)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+_shared_client: Optional[httpx.AsyncClient] = None
+
+
+def get_shared_http_client() -> httpx.AsyncClient:
+    """Возвращает общий для процесса httpx.AsyncClient (создаётся лениво)."""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = httpx.AsyncClient(
+            limits=HTTP_LIMITS,
+            http2=True,
+            timeout=HTTP_TIMEOUT,
+        )
+    return _shared_client
+
+
+async def close_shared_http_client() -> None:
+    """Закрывает общий клиент (вызывать при остановке бота)."""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
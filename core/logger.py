@@ -1,16 +1,46 @@
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
+
 from core.config import settings
 
-def setup_logging():
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def setup_logging() -> QueueListener:
+    """
+    Configure root logging. Records are only enqueued on the event loop thread;
+    formatting and stdout IO happen in the QueueListener's background thread.
+
+    The caller owns the returned listener and must stop() it on shutdown
+    to flush pending records.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT, style="%")
+    )
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    # AICODE-NOTE: QueueHandler.prepare() подставляет args в message ещё в
+    # потоке вызова (только для записей, прошедших уровень логгера), поэтому
+    # его formatter — голый %(message)s; полный формат применяет listener.
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
     logging.basicConfig(
         level=settings.LOG_LEVEL,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[
-            logging.StreamHandler(sys.stdout)
-        ]
+        handlers=[queue_handler],
+        force=True,
+    )
+    # Reduce noise from third-party libraries if needed.
+    # aiogram не опускается ниже INFO (DEBUG пишет каждый апдейт), но уважает
+    # более строгий LOG_LEVEL.
+    logging.getLogger("aiogram").setLevel(
+        max(logging.INFO, logging.getLevelName(settings.LOG_LEVEL))
     )
-    # Reduce noise from third-party libraries if needed
-    logging.getLogger("aiogram").setLevel(settings.LOG_LEVEL)
     logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
 
+    listener.start()
+    return listener
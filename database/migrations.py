@@ -0,0 +1,233 @@
+"""
+Разовое обновление БД, созданной до перехода на текущие модели.
+
+Alembic в проекте пока не подключён, а create_all не меняет уже существующие
+таблицы. Поэтому бот при старте сверяет схему (verify_schema) и отказывается
+работать на необновлённой БД, а обновляет её отдельный запуск:
+
+    python -m database.migrations
+
+Каждый шаг сначала проверяет, нужен ли он, поэтому повторный запуск ничего
+не меняет. Перед запуском сделайте копию файла БД.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import Connection, Integer, event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from database.models import Category, Transaction
+from database.session import get_database_url
+
+logger = logging.getLogger(__name__)
+
+
+class _Migration(NamedTuple):
+    description: str
+    is_pending: Callable[[Connection], bool]
+    apply: Callable[[Connection], None]
+
+
+def _amount_in_rubles(sync_conn: Connection) -> bool:
+    """transactions.amount ещё Numeric(12, 2) в рублях, а не BigInteger в копейках."""
+    inspector = inspect(sync_conn)
+    if not inspector.has_table("transactions"):
+        return False
+    columns = {
+        column["name"]: column["type"]
+        for column in inspector.get_columns("transactions")
+    }
+    return not isinstance(columns["amount"], Integer)
+
+
+def _convert_amount_to_kopecks(sync_conn: Connection) -> None:
+    # Округление то же, что и в FinanceService._normalize_amount.
+    if sync_conn.dialect.name == "postgresql":
+        sync_conn.exec_driver_sql(
+            "ALTER TABLE transactions ALTER COLUMN amount TYPE BIGINT"
+            " USING round(amount * 100)::bigint"
+        )
+        return
+
+    # SQLite не меняет тип колонки на месте: пересобираем таблицу по модели.
+    # Старые индексы переименованная таблица уносит с собой — удаляем их,
+    # чтобы имена освободились для индексов новой таблицы.
+    for index in inspect(sync_conn).get_indexes("transactions"):
+        sync_conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+    sync_conn.exec_driver_sql("ALTER TABLE transactions RENAME TO _transactions_rubles")
+    Transaction.__table__.create(sync_conn)
+    sync_conn.exec_driver_sql(
+        "INSERT INTO transactions"
+        " (id, user_id, amount, category, raw_text, date, created_at)"
+        " SELECT id, user_id, CAST(ROUND(amount * 100) AS INTEGER),"
+        " category, raw_text, date, created_at FROM _transactions_rubles"
+    )
+    sync_conn.exec_driver_sql("DROP TABLE _transactions_rubles")
+
+
+def _categories_without_lc(sync_conn: Connection) -> bool:
+    """В categories ещё нет колонок name_lc / match_text_lc."""
+    inspector = inspect(sync_conn)
+    if not inspector.has_table("categories"):
+        return False
+    columns = {column["name"] for column in inspector.get_columns("categories")}
+    return "name_lc" not in columns
+
+
+def _lowercased_categories(sync_conn: Connection) -> List[dict]:
+    # AICODE-NOTE: lower() в SQLite понижает только ASCII («Кафе» остался бы
+    # «Кафе»), поэтому *_lc считаем в Python, как и _lowercase_of в моделях.
+    rows = [
+        {
+            "id": row.id,
+            "user_id": row.user_id,
+            "name_lc": row.name.lower(),
+            "match_text_lc": row.match_text.lower(),
+        }
+        for row in sync_conn.execute(
+            text("SELECT id, user_id, name, match_text FROM categories")
+        )
+    ]
+    seen = set()
+    duplicates = set()
+    for row in rows:
+        key = (row["user_id"], row["name_lc"])
+        if key in seen:
+            duplicates.add(key)
+        seen.add(key)
+    if duplicates:
+        raise RuntimeError(
+            "Категории, совпадающие без учёта регистра, нарушат "
+            "uq_categories_user_name_lc; переименуйте или удалите их: "
+            + ", ".join(f"user_id={uid} «{name}»" for uid, name in sorted(duplicates))
+        )
+    return rows
+
+
+_UPDATE_CATEGORY_LC = text(
+    "UPDATE categories SET name_lc = :name_lc, match_text_lc = :match_text_lc"
+    " WHERE id = :id"
+)
+
+
+def _backfill_category_lc(sync_conn: Connection) -> None:
+    rows = _lowercased_categories(sync_conn)
+
+    if sync_conn.dialect.name == "postgresql":
+        sync_conn.exec_driver_sql(
+            "ALTER TABLE categories ADD COLUMN name_lc VARCHAR(100),"
+            " ADD COLUMN match_text_lc VARCHAR(255)"
+        )
+        if rows:
+            sync_conn.execute(_UPDATE_CATEGORY_LC, rows)
+        sync_conn.exec_driver_sql(
+            "ALTER TABLE categories ALTER COLUMN name_lc SET NOT NULL,"
+            " ALTER COLUMN match_text_lc SET NOT NULL,"
+            " ADD CONSTRAINT uq_categories_user_name_lc UNIQUE (user_id, name_lc)"
+        )
+        # Префикс уникального индекса покрывает user_id, старый индекс не нужен.
+        sync_conn.exec_driver_sql("DROP INDEX IF EXISTS ix_categories_user_id")
+        for index in Category.__table__.indexes:
+            index.create(sync_conn)
+        return
+
+    # SQLite не добавляет NOT NULL-колонки и ограничения к таблице с данными:
+    # пересобираем таблицу по модели, *_lc сначала копируют исходный текст.
+    for index in inspect(sync_conn).get_indexes("categories"):
+        sync_conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+    sync_conn.exec_driver_sql("ALTER TABLE categories RENAME TO _categories_legacy")
+    Category.__table__.create(sync_conn)
+    sync_conn.exec_driver_sql(
+        "INSERT INTO categories"
+        " (id, user_id, name, name_lc, match_text, match_text_lc, created_at)"
+        " SELECT id, user_id, name, name, match_text, match_text, created_at"
+        " FROM _categories_legacy"
+    )
+    sync_conn.exec_driver_sql("DROP TABLE _categories_legacy")
+    if rows:
+        sync_conn.execute(_UPDATE_CATEGORY_LC, rows)
+
+
+# По одной записи на изменение схемы, в порядке применения.
+_MIGRATIONS = (
+    _Migration(
+        "transactions.amount: рубли (Numeric) -> копейки (BigInteger)",
+        _amount_in_rubles,
+        _convert_amount_to_kopecks,
+    ),
+    _Migration(
+        "categories: колонки name_lc / match_text_lc и их индексы",
+        _categories_without_lc,
+        _backfill_category_lc,
+    ),
+)
+
+
+def _pending(sync_conn: Connection) -> List[str]:
+    return [m.description for m in _MIGRATIONS if m.is_pending(sync_conn)]
+
+
+def _apply_pending(sync_conn: Connection) -> List[str]:
+    applied = []
+    for migration in _MIGRATIONS:
+        if migration.is_pending(sync_conn):
+            migration.apply(sync_conn)
+            applied.append(migration.description)
+    return applied
+
+
+async def verify_schema(engine: AsyncEngine) -> None:
+    """Бросает RuntimeError, если схема БД старше моделей."""
+    async with engine.connect() as conn:
+        pending = await conn.run_sync(_pending)
+    if pending:
+        raise RuntimeError(
+            "Схема БД устарела, нужно обновление: "
+            + "; ".join(pending)
+            + ". Запустите python -m database.migrations."
+        )
+
+
+def _create_migration_engine() -> AsyncEngine:
+    migration_engine = create_async_engine(get_database_url(), poolclass=NullPool)
+    if migration_engine.dialect.name == "sqlite":
+        # AICODE-NOTE: pysqlite не открывает транзакцию перед DDL, и
+        # пересборка таблицы шла бы по шагам без отката. Рецепт из
+        # документации SQLAlchemy: отключаем его BEGIN и выдаём свой.
+        @event.listens_for(migration_engine.sync_engine, "connect")
+        def _disable_driver_begin(dbapi_connection, connection_record) -> None:
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(migration_engine.sync_engine, "begin")
+        def _begin(conn) -> None:
+            conn.exec_driver_sql("BEGIN")
+
+    return migration_engine
+
+
+async def upgrade() -> List[str]:
+    """Применяет все нужные шаги в одной транзакции; возвращает их описания."""
+    migration_engine = _create_migration_engine()
+    try:
+        async with migration_engine.begin() as conn:
+            return await conn.run_sync(_apply_pending)
+    finally:
+        await migration_engine.dispose()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    applied = asyncio.run(upgrade())
+    if not applied:
+        logger.info("Схема БД актуальна, обновлять нечего.")
+    for description in applied:
+        logger.info("Обновлено: %s", description)
+
+
+if __name__ == "__main__":
+    main()
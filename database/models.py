@@ -1,7 +1,6 @@
 from __future__ import annotations
 
-from datetime import date, datetime
-from decimal import Decimal
+from datetime import date, datetime, timezone
 from typing import List, Optional
 
 from sqlalchemy import (
@@ -9,9 +8,10 @@ from sqlalchemy import (
     Date,
     DateTime,
     ForeignKey,
+    Index,
     JSON,
-    Numeric,
     String,
+    UniqueConstraint,
     Text,
     func,
 )
@@ -20,6 +20,12 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 from database.base import Base
 
 
+# Timestamps are filled client-side so a freshly flushed object already has
+# them and no refresh SELECT is needed; server_default stays for raw inserts.
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -28,7 +34,10 @@ class User(Base):
         BigInteger, nullable=False, unique=True, index=True
     )
     registered_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True),
+        default=_utcnow,
+        server_default=func.now(),
+        nullable=False,
     )
     settings: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
 
@@ -42,36 +51,81 @@ class User(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    # (user_id, date, id) matches list_for_user's ORDER BY date DESC, id DESC
+    # (scanned backwards) and serves the date-range stats query by its prefix,
+    # so a separate user_id index is not needed.
+    # AICODE-NOTE: На Postgres индекс покрывающий (INCLUDE category, amount):
+    # недельная статистика читается index-only scan'ом без похода в таблицу.
+    # SQLite INCLUDE не поддерживает, там индекс обычный.
+    __table_args__ = (
+        Index(
+            "ix_tx_user_date_id",
+            "user_id",
+            "date",
+            "id",
+            postgresql_include=["category", "amount"],
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
-        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
-    amount: Mapped[Decimal] = mapped_column(Numeric(12, 2), nullable=False)
+    # Amount in minor units (kopecks): integer SUM() and no Decimal per row.
+    # Older databases stored Numeric(12, 2) rubles: python -m database.migrations.
+    amount: Mapped[int] = mapped_column(BigInteger, nullable=False)
     category: Mapped[str] = mapped_column(String(100), nullable=False)
     raw_text: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     date: Mapped[date] = mapped_column(
         Date, server_default=func.current_date(), nullable=False
     )
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True),
+        default=_utcnow,
+        server_default=func.now(),
+        nullable=False,
     )
 
     user: Mapped[User] = relationship(back_populates="transactions")
 
 
+def _lowercase_of(column_name: str):
+    """Column default that stores a Python-lowercased copy of another column."""
+
+    def _default(context) -> str:
+        return context.get_current_parameters()[column_name].lower()
+
+    return _default
+
+
 class Category(Base):
     __tablename__ = "categories"
+    # AICODE-NOTE: *_lc are filled client-side instead of Computed("lower(...)"):
+    # SQLite's lower() only folds ASCII, so it would not lowercase Cyrillic.
+    # Older databases get them backfilled by python -m database.migrations.
+    # AICODE-TODO: No onupdate yet (categories are not editable).
+    __table_args__ = (
+        UniqueConstraint("user_id", "name_lc", name="uq_categories_user_name_lc"),
+        Index("ix_categories_user_match_lc", "user_id", "match_text_lc"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
-        ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
+        ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
     name: Mapped[str] = mapped_column(String(100), nullable=False)
+    name_lc: Mapped[str] = mapped_column(
+        String(100), default=_lowercase_of("name"), nullable=False
+    )
     match_text: Mapped[str] = mapped_column(String(255), nullable=False)
+    match_text_lc: Mapped[str] = mapped_column(
+        String(255), default=_lowercase_of("match_text"), nullable=False
+    )
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True),
+        default=_utcnow,
+        server_default=func.now(),
+        nullable=False,
     )
 
     user: Mapped[User] = relationship(back_populates="categories")
-
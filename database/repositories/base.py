@@ -1,28 +1,58 @@
 from __future__ import annotations
 
+from typing import Any, Dict, Type, TypeVar
+
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from database.base import Base
+
+ModelT = TypeVar("ModelT", bound=Base)
+
 
+# AICODE-NOTE: Слой репозиториев не компилируем (mypyc/Cython): каждый метод —
+# это await на поток aiosqlite и SQLAlchemy, которые всё равно исполняются в
+# Python, так что выигрыш от компиляции обёрток теряется на фоне I/O, а сборка
+# потребовала бы упаковки и колёс, которых у проекта нет.
+# AICODE-TODO: Если вернёмся к mypyc — начать с полной типизации репозиториев
+# (как здесь) и прогнать mypy --strict по database/.
 class BaseRepository:
-    """Shared helpers for repositories."""
+    """Shared helpers for repositories.
+
+    Repositories only flush; the caller owns the transaction and commits it
+    (``async with session.begin():`` in handlers).
+
+    They are created per session on every message, so they carry no state
+    besides the session and use ``__slots__`` to keep that allocation small.
+    """
 
-    def __init__(self, session: AsyncSession):
+    __slots__ = ("session",)
+
+    def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
-    async def add(self, instance):
+    async def add(self, instance: ModelT) -> ModelT:
         self.session.add(instance)
         await self.session.flush()
         return instance
 
-    async def delete(self, instance):
+    async def insert_returning(
+        self, model: Type[ModelT], values: Dict[str, Any]
+    ) -> ModelT:
+        """
+        INSERT one row and get the persistent ORM object back in the same
+        round trip via RETURNING (id, client and server defaults), without a
+        unit-of-work flush or a follow-up refresh.
+        """
+        result = await self.session.scalars(
+            insert(model).values(**values).returning(model)
+        )
+        return result.one()
+
+    async def delete(self, instance: Base) -> None:
         await self.session.delete(instance)
         await self.session.flush()
 
-    async def commit(self):
-        await self.session.commit()
-
-    async def refresh(self, instance):
+    async def refresh(self, instance: ModelT) -> ModelT:
         await self.session.refresh(instance)
         return instance
-
-
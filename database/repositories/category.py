@@ -2,62 +2,89 @@ from __future__ import annotations
 
 from typing import List, Optional
 
-from sqlalchemy import func, select
+from sqlalchemy import String, bindparam, func, select
 
 from database.models import Category
 from database.repositories.base import BaseRepository
 
+# Hot-path statements are built once at import; only parameters vary per call.
+_ORDER_BY_CREATED = (Category.created_at.asc(), Category.id.asc())
+_SELECT_BY_USER = (
+    select(Category)
+    .where(Category.user_id == bindparam("user_id"))
+    .order_by(*_ORDER_BY_CREATED)
+)
+_SELECT_BY_NAME_CI = select(Category).where(
+    Category.user_id == bindparam("user_id"),
+    Category.name_lc == bindparam("name_lc"),
+)
+_SELECT_BY_MATCH_TEXT_CI = select(Category).where(
+    Category.user_id == bindparam("user_id"),
+    Category.match_text_lc == bindparam("match_text_lc"),
+)
+# AICODE-NOTE: Подстрока через LIKE '%' || триггер || '%' работает и в SQLite,
+# и в Postgres (instr есть только в SQLite). Спецсимволы LIKE в самом
+# триггере экранируем, чтобы "_" или "%" совпадали буквально.
+_LIKE_ESCAPE = "/"
+_MATCH_TEXT_LIKE_LITERAL = func.replace(
+    func.replace(
+        func.replace(Category.match_text_lc, _LIKE_ESCAPE, _LIKE_ESCAPE * 2),
+        "%",
+        _LIKE_ESCAPE + "%",
+    ),
+    "_",
+    _LIKE_ESCAPE + "_",
+)
+_SELECT_FIRST_MATCH = (
+    select(Category)
+    .where(
+        Category.user_id == bindparam("user_id"),
+        bindparam("text_lower", type_=String).contains(
+            _MATCH_TEXT_LIKE_LITERAL, escape=_LIKE_ESCAPE
+        ),
+    )
+    .order_by(*_ORDER_BY_CREATED)
+    .limit(1)
+)
+
 
 class CategoryRepository(BaseRepository):
+    __slots__ = ()
+
     async def list_by_user(self, user_id: int) -> List[Category]:
-        stmt = (
-            select(Category)
-            .where(Category.user_id == user_id)
-            .order_by(Category.created_at.asc(), Category.id.asc())
-        )
-        result = await self.session.execute(stmt)
+        result = await self.session.execute(_SELECT_BY_USER, {"user_id": user_id})
         return list(result.scalars().all())
 
     async def get_by_name_ci(self, user_id: int, name: str) -> Optional[Category]:
-        stmt = select(Category).where(
-            Category.user_id == user_id,
-            func.lower(Category.name) == func.lower(name),
+        result = await self.session.execute(
+            _SELECT_BY_NAME_CI, {"user_id": user_id, "name_lc": name.lower()}
         )
-        result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
 
     async def get_by_match_text_ci(
         self, user_id: int, match_text: str
     ) -> Optional[Category]:
-        stmt = select(Category).where(
-            Category.user_id == user_id,
-            func.lower(Category.match_text) == func.lower(match_text),
+        result = await self.session.execute(
+            _SELECT_BY_MATCH_TEXT_CI,
+            {"user_id": user_id, "match_text_lc": match_text.lower()},
         )
-        result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
 
     async def create(
         self, user_id: int, name: str, match_text: str
     ) -> Category:
-        category = Category(
-            user_id=user_id,
-            name=name,
-            match_text=match_text,
+        return await self.insert_returning(
+            Category,
+            {"user_id": user_id, "name": name, "match_text": match_text},
         )
-        await self.add(category)
-        await self.session.commit()
-        await self.session.refresh(category)
-        return category
 
     async def find_match_for_text(
         self, user_id: int, text: str
     ) -> Optional[Category]:
-        normalized_text = text.lower()
-        categories = await self.list_by_user(user_id)
-        for category in categories:
-            if category.match_text.lower() in normalized_text:
-                # AICODE-NOTE: Простая подстрочная проверка для MVP; может давать
-                # ложные срабатывания на общие слова.
-                return category
-        return None
-
+        # AICODE-NOTE: Подстрочная проверка выполняется в БД и возвращает
+        # только первую (самую раннюю) подходящую категорию; может давать
+        # ложные срабатывания на общие слова.
+        result = await self.session.execute(
+            _SELECT_FIRST_MATCH, {"user_id": user_id, "text_lower": text.lower()}
+        )
+        return result.scalar_one_or_none()
@@ -1,20 +1,32 @@
 from __future__ import annotations
 
 from datetime import date
-from decimal import Decimal
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import Row, bindparam, func, insert, select
 
 from database.models import Transaction
 from database.repositories.base import BaseRepository
 
+_SELECT_BY_ID = select(Transaction).where(Transaction.id == bindparam("id"))
+_TOTAL_AMOUNT = func.sum(Transaction.amount).label("total_amount")
+_SUM_BY_CATEGORY = (
+    select(Transaction.category, _TOTAL_AMOUNT)
+    .where(
+        Transaction.user_id == bindparam("user_id"),
+        Transaction.date >= bindparam("start_date"),
+        Transaction.date <= bindparam("end_date"),
+    )
+    .group_by(Transaction.category)
+    .order_by(_TOTAL_AMOUNT.desc())
+)
+
 
 class TransactionRepository(BaseRepository):
+    __slots__ = ()
+
     async def get_by_id(self, transaction_id: int) -> Optional[Transaction]:
-        result = await self.session.execute(
-            select(Transaction).where(Transaction.id == transaction_id)
-        )
+        result = await self.session.execute(_SELECT_BY_ID, {"id": transaction_id})
         return result.scalar_one_or_none()
 
     async def list_for_user(
@@ -32,33 +44,67 @@ class TransactionRepository(BaseRepository):
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
+    async def sum_by_category(
+        self, user_id: int, start_date: date, end_date: date
+    ) -> Sequence[Row]:
+        """
+        Aggregate amounts per category in SQL for [start_date, end_date].
+
+        Returns (category, total_amount) rows, largest total first.
+        """
+        result = await self.session.execute(
+            _SUM_BY_CATEGORY,
+            {"user_id": user_id, "start_date": start_date, "end_date": end_date},
+        )
+        return result.all()
+
+    @staticmethod
+    def build_row(
+        user_id: int,
+        amount_kopecks: int,
+        category: str,
+        raw_text: str | None = None,
+        spend_date: date | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Column values for a transactions row. amount_kopecks is already
+        normalized (see FinanceService._normalize_amount).
+        """
+        return {
+            "user_id": user_id,
+            "amount": amount_kopecks,
+            "category": category,
+            "raw_text": raw_text,
+            "date": spend_date or date.today(),
+        }
+
     async def create(
         self,
         user_id: int,
-        amount: Decimal | float | int,
+        amount_kopecks: int,
         category: str,
         raw_text: str | None = None,
         spend_date: date | None = None,
     ) -> Transaction:
-        decimal_amount = Decimal(str(amount))
-        transaction = Transaction(
-            user_id=user_id,
-            amount=decimal_amount,
-            category=category,
-            raw_text=raw_text,
-            date=spend_date or date.today(),
+        return await self.insert_returning(
+            Transaction,
+            self.build_row(user_id, amount_kopecks, category, raw_text, spend_date),
         )
-        await self.add(transaction)
-        await self.session.commit()
-        await self.session.refresh(transaction)
-        return transaction
+
+    async def create_many(self, rows: Sequence[Dict[str, Any]]) -> None:
+        """
+        Insert several rows (as produced by build_row) in one executemany INSERT.
+        No ORM objects are created; the caller's transaction commits them.
+        """
+        if not rows:
+            return
+        await self.session.execute(insert(Transaction), list(rows))
 
     async def delete_by_id(self, transaction_id: int) -> bool:
         transaction = await self.get_by_id(transaction_id)
         if not transaction:
             return False
-        await self.session.delete(transaction)
-        await self.session.commit()
+        await self.delete(transaction)
         return True
 
 
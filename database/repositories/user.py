@@ -1,31 +1,106 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import Any, Callable, Optional
 
-from sqlalchemy import select
+from cachetools import LRUCache
+from sqlalchemy import bindparam, event, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
 
 from database.models import User
 from database.repositories.base import BaseRepository
 
+# AICODE-NOTE: Процессный кэш telegram_id -> users.id: соответствие неизменно,
+# а запрос пользователя идёт на каждое входящее сообщение. Новые пользователи
+# попадают в кэш только после COMMIT, чтобы откат не оставил в нём чужой id.
+# LRU ограничивает память: активных пользователей мало, остальные вытесняются.
+# Лок не нужен — чтение и запись синхронные, между ними нет await.
+USER_ID_CACHE_MAXSIZE = 10_000
+_TG_TO_UID: LRUCache[int, int] = LRUCache(maxsize=USER_ID_CACHE_MAXSIZE)
+_PENDING_USER_IDS_KEY = "pending_telegram_user_ids"
+
+# Hot-path statements are built once at import; only parameters vary per call.
+_SELECT_BY_ID = select(User).where(User.id == bindparam("user_id"))
+_SELECT_BY_TELEGRAM_ID = select(User).where(
+    User.telegram_id == bindparam("telegram_id")
+)
+
+
+def _build_upsert(insert_fn: Callable[..., Any], returning: Any):
+    # AICODE-NOTE: DO UPDATE (no-op) вместо DO NOTHING — иначе RETURNING
+    # не вернёт уже существующую строку.
+    stmt = insert_fn(User).values(telegram_id=bindparam("telegram_id"))
+    return stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={"telegram_id": stmt.excluded.telegram_id},
+    ).returning(returning)
+
+
+# INSERT ... ON CONFLICT есть только в диалектных insert(): по одному на бэкенд.
+_UPSERT_RETURNING_ID = {
+    "sqlite": _build_upsert(sqlite_insert, User.id),
+    "postgresql": _build_upsert(pg_insert, User.id),
+}
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending_user_ids(session: Session) -> None:
+    pending = session.info.pop(_PENDING_USER_IDS_KEY, None)
+    if pending:
+        _TG_TO_UID.update(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_user_ids(session: Session) -> None:
+    session.info.pop(_PENDING_USER_IDS_KEY, None)
+
 
 class UserRepository(BaseRepository):
+    __slots__ = ()
+
     async def get_by_id(self, user_id: int) -> Optional[User]:
-        result = await self.session.execute(
-            select(User).where(User.id == user_id)
-        )
+        result = await self.session.execute(_SELECT_BY_ID, {"user_id": user_id})
         return result.scalar_one_or_none()
 
     async def get_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         result = await self.session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+            _SELECT_BY_TELEGRAM_ID, {"telegram_id": telegram_id}
         )
         return result.scalar_one_or_none()
 
-    async def create(self, telegram_id: int, settings: dict | None = None) -> User:
-        user = User(telegram_id=telegram_id, settings=settings)
-        await self.add(user)
-        await self.session.commit()
-        await self.session.refresh(user)
-        return user
+    def _remember_after_commit(self, telegram_id: int, user_id: int) -> None:
+        pending = self.session.sync_session.info.setdefault(
+            _PENDING_USER_IDS_KEY, {}
+        )
+        pending[telegram_id] = user_id
 
+    def _dialect_name(self) -> str:
+        return self.session.get_bind().dialect.name
 
+    async def get_or_create_returning_id(self, telegram_id: int) -> int:
+        """
+        INSERT ... ON CONFLICT (telegram_id) DO UPDATE ... RETURNING id: one round
+        trip for both new and existing users, without loading a User object.
+        """
+        result = await self.session.execute(
+            _UPSERT_RETURNING_ID[self._dialect_name()],
+            {"telegram_id": telegram_id},
+        )
+        user_id = result.scalar_one()
+        self._remember_after_commit(telegram_id, user_id)
+        return user_id
+
+    async def get_or_create_id(self, telegram_id: int) -> int:
+        """Resolve users.id from the cache, falling back to a single upsert."""
+        user_id = _TG_TO_UID.get(telegram_id)
+        if user_id is not None:
+            return user_id
+        return await self.get_or_create_returning_id(telegram_id)
+
+    async def create(self, telegram_id: int, settings: dict | None = None) -> User:
+        user = await self.insert_returning(
+            User, {"telegram_id": telegram_id, "settings": settings}
+        )
+        self._remember_after_commit(telegram_id, user.id)
+        return user
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 from contextlib import asynccontextmanager
+from functools import cache
 from pathlib import Path
-from typing import AsyncIterator
+from typing import Any, AsyncIterator, Dict
 
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -14,9 +17,13 @@ from sqlalchemy.ext.asyncio import (
 from core.config import settings
 
 
+@cache
 def get_database_path() -> Path:
     """
     Resolve the database path. If DB_NAME is relative, place DB file in project root.
+
+    Settings are frozen at import, so the result (and the stat() calls behind
+    Path.resolve()) is computed once per process.
     """
     db_path = Path(settings.DB_NAME)
     if not db_path.is_absolute():
@@ -24,17 +31,69 @@ def get_database_path() -> Path:
     return db_path
 
 
+@cache
 def get_database_url() -> str:
+    if settings.DATABASE_URL:
+        return settings.DATABASE_URL
     db_path = get_database_path()
     return f"sqlite+aiosqlite:///{db_path}"
 
 
+def get_pool_options() -> Dict[str, Any]:
+    """Engine pool keyword arguments built from settings."""
+    if settings.DB_USE_NULL_POOL:
+        # Режим для PgBouncer: соединения пулит он, приложение их не держит.
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+
 # AICODE-NOTE: Resolve DB path relative to project root for local dev convenience.
-engine: AsyncEngine = create_async_engine(get_database_url(), echo=False, future=True)
+# Пул держит соединения открытыми весь жизненный цикл бота: без пересоздания
+# не повторяются open() файла БД/WAL/SHM и PRAGMA (или TLS к Postgres) при
+# каждом сообщении. Дефолтный пул (5, без overflow) рассчитан на SQLite;
+# одиночное соединение не берём: все пользователи встали бы в очередь за ним.
+engine: AsyncEngine = create_async_engine(
+    get_database_url(),
+    echo=False,
+    future=True,
+    **get_pool_options(),
+)
 async_session_factory = async_sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession
 )
 
+# AICODE-NOTE: WAL + synchronous=NORMAL убирают fsync на каждый commit (бот
+# коммитит на каждое сообщение), остальное — кэш страниц и temp-таблицы в памяти.
+# journal_mode=WAL сохраняется в файле БД, остальные PRAGMA действуют на соединение.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Apply connection-level SQLite PRAGMAs once per new DBAPI connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 
 @asynccontextmanager
 async def get_session() -> AsyncIterator[AsyncSession]:
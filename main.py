@@ -1,7 +1,7 @@
 import asyncio
 import logging
-import tempfile
-from pathlib import Path
+from io import BytesIO
+from typing import List, Optional, Tuple
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command, CommandStart
@@ -11,17 +11,27 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from core.config import settings
+from core.http import close_shared_http_client
 from core.logger import setup_logging
+from database.migrations import verify_schema
+from database.models import Category
 from database.repositories.user import UserRepository
-from database.session import get_session
-from services.ai_service import AIService
-from services.finance_service import FinanceService, TransactionInput
+from database.session import engine, get_session
+from services.ai_service import AIService, BatchingParser
+from services.finance_service import (
+    FinanceService,
+    TransactionInput,
+    format_amount,
+)
+from services.transaction_writer import TransactionBatchWriter
 
 
 logger = logging.getLogger(__name__)
 bot = Bot(token=settings.BOT_TOKEN.get_secret_value())
 dp = Dispatcher(storage=MemoryStorage())
 ai_service = AIService()
+transaction_parser = BatchingParser(ai_service)
+transaction_writer = TransactionBatchWriter(get_session)
 
 main_menu = ReplyKeyboardMarkup(
     keyboard=[
@@ -44,82 +54,114 @@ class AddCategoryState(StatesGroup):
     waiting_for_match_text = State()
 
 
-async def ensure_user(session, telegram_id: int):
-    repo = UserRepository(session)
-    user = await repo.get_by_telegram_id(telegram_id)
-    if user:
-        return user
-    return await repo.create(telegram_id=telegram_id)
+async def ensure_user(session, telegram_id: int) -> int:
+    # Вызывается внутри транзакции хендлера: commit делает вызывающий код.
+    # Возвращаем только users.id — хендлерам больше ничего не нужно, а id
+    # берётся из процессного кэша, на промахе — одним upsert-запросом.
+    return await UserRepository(session).get_or_create_id(telegram_id)
 
 
 async def send_stats(message: Message):
-    async with get_session() as session:
-        user = await ensure_user(session, message.from_user.id)
+    async with get_session() as session, session.begin():
+        user_id = await ensure_user(session, message.from_user.id)
         finance_service = FinanceService(session)
-        stats = await finance_service.get_week_stats(user.id)
+        stats = await finance_service.get_week_stats(user_id)
 
     if not stats:
         await message.answer("За последние 7 дней трат пока нет.", reply_markup=main_menu)
         return
 
-    lines = [f"• {item.category}: {item.total} RUB" for item in stats]
+    lines = [
+        f"• {item.category}: {format_amount(item.total)} RUB" for item in stats
+    ]
     await message.answer(
         "Статистика за 7 дней:\n" + "\n".join(lines), reply_markup=main_menu
     )
 
 
+async def load_user_context(telegram_id: int) -> Tuple[int, List[Category]]:
+    """Возвращает users.id и категории пользователя одной короткой транзакцией."""
+    async with get_session() as session, session.begin():
+        user_id = await ensure_user(session, telegram_id)
+        user_categories = await FinanceService(session).list_categories(user_id)
+    return user_id, user_categories
+
+
 async def process_user_text(
-    message: Message, user_text: str, raw_text: str | None = None
+    message: Message,
+    user_text: str,
+    raw_text: str | None = None,
+    user_context: Optional[Tuple[int, List[Category]]] = None,
 ):
+    """
+    Разбирает текст траты и сохраняет её. user_context — уже загруженные
+    (users.id, категории), если хендлер получил их заранее (см. handle_voice).
+    """
     raw_message = raw_text or user_text
-    async with get_session() as session:
+    if user_context is None:
         try:
-            user = await ensure_user(session, message.from_user.id)
-            finance_service = FinanceService(session)
-            user_categories = await finance_service.list_categories(user.id)
+            user_context = await load_user_context(message.from_user.id)
         except Exception as exc:  # noqa: BLE001
             logger.exception("Ошибка при подготовке данных пользователя: %s", exc)
             await message.answer("Не получилось обработать запрос, попробуйте позже.")
             return
+    user_id, user_categories = user_context
 
-        try:
-            parsed = await ai_service.parse_transaction_text(
-                user_text,
-                preferred_categories=[category.name for category in user_categories],
-            )
-        except Exception as exc:  # noqa: BLE001
-            logger.exception("Не удалось распарсить сообщение: %s", exc)
-            await message.answer(
-                "Не получилось понять трату. "
-                "Попробуйте переформулировать."
-            )
-            return
+    # AICODE-NOTE: LLM вызываем вне транзакции, чтобы не держать соединение
+    # и блокировку записи SQLite на время сетевого запроса. Сообщения,
+    # пришедшие почти одновременно, разбираются одним запросом к провайдеру.
+    try:
+        parsed = await transaction_parser.submit(
+            user_text,
+            preferred_categories=[category.name for category in user_categories],
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Не удалось распарсить сообщение: %s", exc)
+        await message.answer(
+            "Не получилось понять трату. "
+            "Попробуйте переформулировать."
+        )
+        return
 
-        try:
-            await finance_service.add_transaction(
-                TransactionInput(
-                    user_id=user.id,
-                    amount=parsed.amount,
-                    category=parsed.category,
-                    raw_text=raw_message,
-                    spend_date=parsed.date,
-                ),
-                user_categories=user_categories,
-            )
-        except Exception as exc:  # noqa: BLE001
-            logger.exception("Ошибка при сохранении транзакции: %s", exc)
-            await message.answer("Не получилось сохранить трату, попробуйте позже.")
-            return
+    # Категории уже загружены: строка собирается без сессии и запросов к БД.
+    try:
+        transaction_row = FinanceService.build_transaction_row(
+            TransactionInput(
+                user_id=user_id,
+                amount=parsed.amount,
+                category=parsed.category,
+                raw_text=raw_message,
+                spend_date=parsed.date,
+            ),
+            user_categories,
+        )
+    except ValueError as exc:
+        logger.warning("Некорректная трата от LLM: %s", exc)
+        await message.answer(
+            "Не получилось понять трату. "
+            "Попробуйте переформулировать."
+        )
+        return
+
+    # Запись идёт через общий буфер: сообщения, пришедшие почти одновременно,
+    # попадают в один INSERT и один COMMIT.
+    try:
+        await transaction_writer.submit(transaction_row)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Ошибка при сохранении транзакции: %s", exc)
+        await message.answer("Не получилось сохранить трату, попробуйте позже.")
+        return
 
     await message.answer(
-        f"✅ Записано: {parsed.category} — {parsed.amount} RUB "
-        f"({parsed.date})"
+        f"✅ Записано: {transaction_row['category']} — "
+        f"{format_amount(transaction_row['amount'])} RUB "
+        f"({transaction_row['date']})"
     )
 
 
 @dp.message(CommandStart())
 async def handle_start(message: Message):
-    async with get_session() as session:
+    async with get_session() as session, session.begin():
         await ensure_user(session, message.from_user.id)
 
     await message.answer(WELCOME_TEXT, reply_markup=main_menu)
@@ -149,10 +191,10 @@ async def handle_add_category_button(message: Message, state: FSMContext):
 
 @dp.message(F.text == "📂 Мои категории")
 async def handle_list_categories(message: Message):
-    async with get_session() as session:
-        user = await ensure_user(session, message.from_user.id)
+    async with get_session() as session, session.begin():
+        user_id = await ensure_user(session, message.from_user.id)
         finance_service = FinanceService(session)
-        categories = await finance_service.list_categories(user.id)
+        categories = await finance_service.list_categories(user_id)
 
     if not categories:
         await message.answer(
@@ -195,13 +237,14 @@ async def handle_add_category_match_text(message: Message, state: FSMContext):
 
     async with get_session() as session:
         try:
-            user = await ensure_user(session, message.from_user.id)
-            finance_service = FinanceService(session)
-            category = await finance_service.create_category(
-                user_id=user.id,
-                name=category_name,
-                match_text=match_text,
-            )
+            async with session.begin():
+                user_id = await ensure_user(session, message.from_user.id)
+                finance_service = FinanceService(session)
+                category = await finance_service.create_category(
+                    user_id=user_id,
+                    name=category_name,
+                    match_text=match_text,
+                )
         except ValueError as exc:  # noqa: BLE001
             await message.answer(f"Не получилось сохранить: {exc}")
             return
@@ -233,36 +276,54 @@ async def handle_text(message: Message):
     await process_user_text(message, message.text or "", raw_text=message.text)
 
 
+async def transcribe_voice(message: Message) -> str:
+    bot_instance = message.bot
+    # AICODE-NOTE: Голосовые короткие, поэтому качаем их в память и отдаём
+    # Whisper тем же буфером — без временного файла, записи на диск и unlink.
+    telegram_file = await bot_instance.get_file(message.voice.file_id)
+    voice_buffer = BytesIO()
+    await bot_instance.download(telegram_file, destination=voice_buffer)
+    voice_buffer.seek(0)
+    return await ai_service.transcribe_audio(voice_buffer)
+
+
 @dp.message(F.voice)
 async def handle_voice(message: Message):
     if not message.voice:
         return
 
-    bot_instance = message.bot
-    tmp_path: Path | None = None
+    # AICODE-NOTE: Пользователь и его категории грузятся параллельно со
+    # скачиванием и транскрибацией: время хендлера — максимум, а не сумма.
+    # TaskGroup при ошибке одной ветки отменяет другую и дожидается её.
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".oga") as tmp_file:
-            tmp_path = Path(tmp_file.name)
-        # AICODE-NOTE: Whisper читает с диска, поэтому сохраняем voice
-        # во временный файл.
-        telegram_file = await bot_instance.get_file(message.voice.file_id)
-        await bot_instance.download(telegram_file, destination=tmp_path)
-
-        transcript = await ai_service.transcribe_audio(str(tmp_path))
-    except Exception as exc:  # noqa: BLE001
-        logger.exception("Ошибка при обработке голосового сообщения: %s", exc)
-        await message.answer(
-            "Не получилось обработать голосовое сообщение, попробуйте ещё раз."
-        )
+        async with asyncio.TaskGroup() as task_group:
+            transcript_task = task_group.create_task(transcribe_voice(message))
+            user_context_task = task_group.create_task(
+                load_user_context(message.from_user.id)
+            )
+    except Exception:  # noqa: BLE001 — ExceptionGroup из TaskGroup
+        # Какая ветка упала, видно по задачам: вторая при этом отменена.
+        if not transcript_task.cancelled() and transcript_task.exception():
+            exc = transcript_task.exception()
+            logger.error(
+                "Ошибка при обработке голосового сообщения: %s", exc, exc_info=exc
+            )
+            await message.answer(
+                "Не получилось обработать голосовое сообщение, попробуйте ещё раз."
+            )
+        else:
+            exc = user_context_task.exception()
+            logger.error(
+                "Ошибка при подготовке данных пользователя: %s", exc, exc_info=exc
+            )
+            await message.answer("Не получилось обработать запрос, попробуйте позже.")
         return
-    finally:
-        if tmp_path:
-            try:
-                tmp_path.unlink(missing_ok=True)
-            except OSError:
-                logger.warning("Не удалось удалить временный файл %s", tmp_path)
 
-    await process_user_text(message, transcript, raw_text=transcript)
+    transcript = transcript_task.result()
+    user_context = user_context_task.result()
+    await process_user_text(
+        message, transcript, raw_text=transcript, user_context=user_context
+    )
 
 
 @dp.message(Command("stats", "week"))
@@ -271,9 +332,24 @@ async def handle_stats(message: Message):
 
 
 async def main():
-    setup_logging()
-    # AICODE-NOTE: Простое polling-приложение для MVP без дополнительных middlewares.
-    await dp.start_polling(bot)
+    log_listener = setup_logging()
+    try:
+        # Старую схему (суммы в рублях) бот не читает корректно — не стартуем.
+        await verify_schema(engine)
+        # AICODE-NOTE: Простое polling-приложение для MVP без дополнительных
+        # middlewares. Long polling (30 с) держит getUpdates открытым до прихода
+        # апдейта, а allowed_updates (выводится из зарегистрированных хендлеров,
+        # сейчас только message) отсекает ненужные типы событий на стороне Telegram.
+        await dp.start_polling(
+            bot,
+            polling_timeout=30,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    finally:
+        await transaction_parser.close()
+        await transaction_writer.close()
+        await close_shared_http_client()
+        log_listener.stop()
 
 
 if __name__ == "__main__":
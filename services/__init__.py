@@ -1,3 +1,3 @@
-from .ai_service import AIService, TransactionDTO
+from .ai_service import AIService, BatchingParser, TransactionDTO
 
-__all__ = ["AIService", "TransactionDTO"]
+__all__ = ["AIService", "BatchingParser", "TransactionDTO"]
@@ -1,29 +1,85 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
 import logging
-from dataclasses import dataclass
+import re
+import unicodedata
+from contextlib import nullcontext
+from dataclasses import dataclass, replace
 from datetime import date as dt_date, datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from string import Template
+from typing import BinaryIO, List, Optional, Tuple
+import orjson
+from cachetools import TTLCache
 from pydantic import BaseModel, Field, SecretStr, ValidationError
-from langchain_core.output_parsers import PydanticOutputParser
 from openai import AsyncOpenAI, OpenAIError
-from phoenix.otel import register
 from opentelemetry.trace import Status, StatusCode
 
 
 from core.config import settings
-from services.llm import generate_chat_response
-from services.prompts import SYSTEM_PROMPT
+from core.http import get_shared_http_client
+from services.llm import generate_chat_response, llm_retry
+from services.micro_batcher import MicroBatcher
+from services.prompts import (
+    BATCH_CATEGORIES_HINT,
+    BATCH_PROMPT_SUFFIX,
+    SCHEMA_PROMPT,
+    SYSTEM_PROMPT_STATIC,
+    SYSTEM_PROMPT_SUFFIX,
+)
 
 logger = logging.getLogger(__name__)
 
-tracer_provider = register(
-    project_name="FinanceBot_Project",
-    endpoint="http://localhost:6006/v1/traces",
-    auto_instrument=True
-)
+PARSE_CACHE_MAXSIZE = 4096
+PARSE_CACHE_TTL_SECONDS = 6 * 60 * 60
+
+PARSE_MAX_TOKENS = 120
+
+MAX_BATCH = 16
+MAX_DELAY_MS = 150
+BATCH_MAX_TOKENS_PER_ITEM = 100
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+def _create_tracer_provider():
+    # AICODE-NOTE: Phoenix импортируем и регистрируем только при ENABLE_TRACING:
+    # auto_instrument оборачивает span'ом каждый вызов OpenAI/httpx, и без
+    # трейсинга это чистые накладные расходы. batch=True — BatchSpanProcessor
+    # (пачки до 512 span'ов раз в 5 с) вместо синхронного экспорта каждого span.
+    if not settings.ENABLE_TRACING:
+        return None
+    from phoenix.otel import register
+
+    return register(
+        project_name="FinanceBot_Project",
+        endpoint=settings.TRACING_ENDPOINT,
+        auto_instrument=True,
+        batch=True,
+    )
+
+
+class _NoopSpan:
+    """Заглушка span'а с теми методами, что вызывает сервис."""
+
+    def set_input(self, *args, **kwargs) -> None:
+        pass
+
+    set_output = set_status = record_exception = set_attribute = set_input
+
+
+class _NoopTracer:
+    _span_context = nullcontext(_NoopSpan())
+
+    def start_as_current_span(self, name: str, **kwargs):
+        return self._span_context
+
+
+tracer_provider = _create_tracer_provider()
 
 
 @dataclass
@@ -34,6 +90,23 @@ class TransactionDTO:
     raw_text: Optional[str] = None
 
 
+def _normalize_for_cache(text: str) -> str:
+    normalized = unicodedata.normalize("NFKC", text).strip().lower()
+    return _WHITESPACE_RE.sub(" ", normalized)
+
+
+def _parse_cache_key(
+    model: str, text: str, today_iso: str, categories: list[str]
+) -> bytes:
+    # AICODE-NOTE: Дата входит в ключ, поэтому после полуночи "вчера"/"сегодня"
+    # не переиспользуют вчерашний разбор; TTL лишь ограничивает жизнь записей.
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (model, today_iso, _normalize_for_cache(text), *categories):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.digest()
+
+
 class TransactionStructured(BaseModel):
     amount: float = Field(
         description="Сумма траты числом, без валюты, строго > 0",
@@ -42,17 +115,64 @@ class TransactionStructured(BaseModel):
     date: dt_date = Field(..., description="Дата операции в формате YYYY-MM-DD")
 
 
+def _parse_structured(message: str) -> TransactionStructured:
+    """
+    Валидирует ответ LLM. Благодаря response_format=json_object обычно это
+    чистый JSON, и хватает model_validate_json; если модель всё же обернула
+    объект в ```json ... ``` или добавила текст вокруг — вырезаем объект.
+    """
+    try:
+        return TransactionStructured.model_validate_json(message)
+    except ValidationError:
+        fenced = _JSON_FENCE_RE.search(message)
+        candidate = fenced.group(1) if fenced else message
+        start, end = candidate.find("{"), candidate.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        payload = orjson.loads(candidate[start : end + 1])
+        return TransactionStructured.model_validate(payload)
+
+
+# Схема модели неизменна — считаем и сериализуем её один раз при импорте.
+# OPT_SORT_KEYS: байты префикса промпта стабильны между запусками и версиями
+# pydantic.
+_SCHEMA = TransactionStructured.model_json_schema()
+_SCHEMA_JSON = orjson.dumps(_SCHEMA, option=orjson.OPT_SORT_KEYS).decode()
+# Неизменный префикс всех запросов разбора (одиночного и пакетного).
+_SYSTEM_PROMPT_PREFIX = SYSTEM_PROMPT_STATIC + Template(SCHEMA_PROMPT).substitute(
+    transaction_schema=_SCHEMA_JSON
+)
+_SUFFIX_TEMPLATE = Template(SYSTEM_PROMPT_SUFFIX)
+
+
+@lru_cache(maxsize=1024)
+def _build_prompt_suffix(today_iso: str, categories_hint: str) -> str:
+    """
+    Переменная часть промпта меняется только со сменой даты и набора категорий
+    пользователя, поэтому форматируем её один раз на сочетание; записи
+    прошлых дней вытесняются LRU.
+    """
+    return _SUFFIX_TEMPLATE.substitute(
+        today_date=today_iso,
+        categories_hint=categories_hint,
+    )
+
+
 class AIService:
     """Сервис для работы с LLM (парсинг текста) и Whisper (STT)."""
 
     def __init__(self):
         self.model = settings.AI_MODEL
         self.audio_client = self._create_audio_client()
-        self.tracer = tracer_provider.get_tracer(__name__)
-        # AICODE-NOTE: Передаем pydantic_object именованным аргументом
-        # для совместимости с текущей версией langchain_core.
-        self.output_parser = PydanticOutputParser(
-            pydantic_object=TransactionStructured
+        self.tracer = (
+            tracer_provider.get_tracer(__name__) if tracer_provider else _NoopTracer()
+        )
+        # AICODE-NOTE: Кэш точных совпадений текста. Между чтением и записью нет await,
+        # поэтому в одном event loop лок не нужен; параллельные промахи по одному ключу
+        # просто сделают по запросу к провайдеру.
+        self._parse_cache: TTLCache[bytes, TransactionDTO] = TTLCache(
+            maxsize=PARSE_CACHE_MAXSIZE,
+            ttl=PARSE_CACHE_TTL_SECONDS,
         )
 
     @staticmethod
@@ -66,7 +186,12 @@ class AIService:
             raise ValueError("OPENAI_API_KEY is required for Whisper STT")
 
         # AICODE-NOTE: Whisper используем через OpenAI даже если чат-провайдер DeepSeek.
-        return AsyncOpenAI(api_key=api_key)
+        # Повторы делает llm_retry, встроенные ретраи SDK отключены.
+        return AsyncOpenAI(
+            api_key=api_key,
+            http_client=get_shared_http_client(),
+            max_retries=0,
+        )
 
     @staticmethod
     def _parse_date(value: str | None) -> dt_date:
@@ -80,6 +205,27 @@ class AIService:
             # AICODE-TODO: Добавить более умный парсинг дат (NLP) при необходимости.
             return dt_date.today()
 
+    @staticmethod
+    def _filter_categories(preferred_categories: Optional[list[str]]) -> list[str]:
+        return [
+            name.strip() for name in preferred_categories or [] if name and name.strip()
+        ]
+
+    def get_cached_parse(
+        self,
+        user_text: str,
+        preferred_categories: Optional[list[str]] = None,
+    ) -> Optional[TransactionDTO]:
+        """Возвращает разбор из кэша без обращения к провайдеру (или None)."""
+        cache_key = _parse_cache_key(
+            self.model,
+            user_text,
+            dt_date.today().isoformat(),
+            self._filter_categories(preferred_categories),
+        )
+        cached = self._parse_cache.get(cache_key)
+        return replace(cached, raw_text=user_text) if cached is not None else None
+
     async def parse_transaction_text(
         self,
         user_text: str,
@@ -89,37 +235,44 @@ class AIService:
         if not user_text or not user_text.strip():
             raise ValueError("Текст для парсинга пустой")
 
+        filtered_categories = self._filter_categories(preferred_categories)
+        today_iso = dt_date.today().isoformat()
+        cache_key = _parse_cache_key(
+            self.model, user_text, today_iso, filtered_categories
+        )
+        cached = self._parse_cache.get(cache_key)
+        if cached is not None:
+            return replace(cached, raw_text=user_text)
+
         categories_hint = ""
-        if preferred_categories:
-            filtered_categories = [
-                name.strip() for name in preferred_categories if name and name.strip()
-            ]
-            if filtered_categories:
-                categories_block = "\n".join(f"- {name}" for name in filtered_categories)
-                categories_hint = (
-                    "Если описание совпадает с одной из пользовательских категорий, "
-                    "выбери её. Пользовательские категории:\n"
-                    f"{categories_block}\n"
-                    "Если не подходит ни одна, предложи краткую новую категорию.\n"
-                )
+        if filtered_categories:
+            categories_block = "\n".join(f"- {name}" for name in filtered_categories)
+            categories_hint = (
+                "Если описание совпадает с одной из пользовательских категорий, "
+                "выбери её. Пользовательские категории:\n"
+                f"{categories_block}\n"
+                "Если не подходит ни одна, предложи краткую новую категорию.\n"
+            )
 
-        prompt = SYSTEM_PROMPT.format(
-            today_date=dt_date.today().isoformat(),
-            transaction_schema=TransactionStructured.model_json_schema(),
-            categories_hint=categories_hint,
-        )
-        with self.tracer.start_as_current_span("parse_transaction_text", openinference_span_kind="chain") as span:
+        prompt_suffix = _build_prompt_suffix(today_iso, categories_hint)
+        with self.tracer.start_as_current_span(
+            "parse_transaction_text", openinference_span_kind="chain"
+        ) as span:
             span.set_input(user_text)
             try:
                 message = await generate_chat_response(
                     model=self.model,
                     messages=[
-                        {"role": "system", "content": prompt},
+                        {"role": "system", "content": _SYSTEM_PROMPT_PREFIX},
+                        {"role": "system", "content": prompt_suffix},
                         {"role": "user", "content": user_text.strip()},
                     ],
                     response_format={"type": "json_object"},
-                    temperature=0.2,
-                    max_tokens=300,
+                    # Ответ — короткий однострочный JSON (~40-80 токенов): больше
+                    # ему не нужно, а stop обрывает генерацию сразу после объекта.
+                    temperature=0,
+                    max_tokens=PARSE_MAX_TOKENS,
+                    stop=["\n\n"],
                 )
             except Exception as exc:
                 span.record_exception(exc)
@@ -128,36 +281,117 @@ class AIService:
                 raise
 
             try:
-                structured = self.output_parser.parse(message)
+                structured = _parse_structured(message)
                 span.set_status(Status(StatusCode.OK))
                 span.set_output(structured)
-            except (ValidationError, json.JSONDecodeError) as exc:
+            except (ValidationError, orjson.JSONDecodeError) as exc:
                 span.record_exception(exc)
                 span.set_status(Status(StatusCode.ERROR, str(exc)))
                 logger.exception("Не удалось распарсить структурированный ответ: %s", message)
                 raise ValueError("Некорректный структурированный ответ от AI провайдера") from exc
 
+        return self._remember_parse(cache_key, structured, user_text)
+
+    def _remember_parse(
+        self,
+        cache_key: bytes,
+        structured: TransactionStructured,
+        user_text: str,
+    ) -> TransactionDTO:
         dto = TransactionDTO(
             amount=structured.amount,
             category=structured.category.strip(),
             date=structured.date,
             raw_text=user_text,
         )
+        self._parse_cache[cache_key] = replace(dto, raw_text=None)
         return dto
 
-    async def transcribe_audio(self, file_path: str) -> str:
-        """Транскрибирует аудио-файл через Whisper."""
-        path = Path(file_path)
-        if not path.exists():
-            raise FileNotFoundError(f"Файл {file_path} не найден")
-        with self.tracer.start_as_current_span("transcribe_audio", openinference_span_kind="chain") as span:
+    async def parse_transaction_batch(
+        self,
+        items: List[Tuple[str, Optional[list[str]]]],
+    ) -> List[Optional[TransactionDTO]]:
+        """
+        Разбирает несколько сообщений одним запросом к LLM.
+
+        Возвращает список той же длины; None — модель не вернула корректный
+        объект для этого сообщения (вызывающий код разбирает его отдельно).
+        Ответ, который не разобрать целиком, даёт ValueError; ошибки провайдера
+        (после повторов llm_retry) пробрасываются как есть.
+        """
+        today_iso = dt_date.today().isoformat()
+        prepared = [
+            (text, self._filter_categories(categories)) for text, categories in items
+        ]
+        payload = orjson.dumps(
+            [
+                {"id": index, "text": text.strip(), "categories": categories}
+                for index, (text, categories) in enumerate(prepared)
+            ]
+        ).decode()
+        prompt_suffix = (
+            _build_prompt_suffix(today_iso, BATCH_CATEGORIES_HINT) + BATCH_PROMPT_SUFFIX
+        )
+        with self.tracer.start_as_current_span(
+            "parse_transaction_batch", openinference_span_kind="chain"
+        ) as span:
+            span.set_input(payload)
+            try:
+                message = await generate_chat_response(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": _SYSTEM_PROMPT_PREFIX},
+                        {"role": "system", "content": prompt_suffix},
+                        {"role": "user", "content": payload},
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0,
+                    max_tokens=BATCH_MAX_TOKENS_PER_ITEM * len(prepared),
+                )
+            except Exception as exc:
+                span.record_exception(exc)
+                span.set_status(Status(StatusCode.ERROR, str(exc)))
+                raise
+
+            try:
+                results = orjson.loads(message)["results"]
+                if not isinstance(results, list):
+                    raise TypeError("results is not a list")
+            except (orjson.JSONDecodeError, KeyError, TypeError) as exc:
+                span.record_exception(exc)
+                span.set_status(Status(StatusCode.ERROR, str(exc)))
+                raise ValueError("Некорректный пакетный ответ AI провайдера") from exc
+            span.set_status(Status(StatusCode.OK))
+            span.set_output(message)
+
+        parsed: List[Optional[TransactionDTO]] = [None] * len(prepared)
+        for result in results:
+            index = result.get("id") if isinstance(result, dict) else None
+            if not isinstance(index, int) or not 0 <= index < len(prepared):
+                continue
+            if parsed[index] is not None:
+                continue
+            try:
+                structured = TransactionStructured.model_validate(result)
+            except ValidationError as exc:
+                logger.warning(
+                    "Некорректный объект в пакетном ответе (id=%s): %s", index, exc
+                )
+                continue
+            text, categories = prepared[index]
+            cache_key = _parse_cache_key(self.model, text, today_iso, categories)
+            parsed[index] = self._remember_parse(cache_key, structured, text)
+        return parsed
+
+    async def transcribe_audio(self, source: str | Path | BinaryIO) -> str:
+        """Транскрибирует аудио (путь к файлу или file-like объект) через Whisper."""
+        if not hasattr(source, "read") and not Path(source).exists():
+            raise FileNotFoundError(f"Файл {source} не найден")
+        with self.tracer.start_as_current_span(
+            "transcribe_audio", openinference_span_kind="chain"
+        ) as span:
             try:
-                with path.open("rb") as audio_file:
-                    response = await self.audio_client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language="ru",
-                    )
+                response = await self._create_transcription(source)
                 span.set_status(Status(StatusCode.OK))
                 span.set_output(response)
             except OpenAIError as exc:
@@ -171,3 +405,111 @@ class AIService:
             raise ValueError("Whisper вернул пустой текст")
 
         return text.strip()
+
+    @llm_retry
+    async def _create_transcription(self, source: str | Path | BinaryIO):
+        if hasattr(source, "read"):
+            # Каждая попытка читает буфер с начала. Имя и MIME нужны
+            # multipart-энкодеру OpenAI, у BytesIO их нет.
+            source.seek(0)
+            return await self.audio_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=("voice.oga", source, "audio/ogg"),
+                language="ru",
+            )
+        with Path(source).open("rb") as audio_file:
+            return await self.audio_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                language="ru",
+            )
+
+
+_PendingParse = Tuple[str, Optional[list[str]], asyncio.Future]
+
+
+class BatchingParser:
+    """
+    Склеивает сообщения, пришедшие в течение короткого окна, в один запрос
+    к LLM (вместо chat.completions на каждое сообщение).
+    """
+
+    def __init__(
+        self,
+        ai_service: AIService,
+        max_batch: int = MAX_BATCH,
+        max_delay_ms: int = MAX_DELAY_MS,
+    ):
+        self._ai_service = ai_service
+        self._batcher: MicroBatcher[_PendingParse] = MicroBatcher(
+            self._flush, window=max_delay_ms / 1000, max_size=max_batch
+        )
+
+    async def submit(
+        self,
+        user_text: str,
+        preferred_categories: Optional[list[str]] = None,
+    ) -> TransactionDTO:
+        """Ставит сообщение в очередь разбора и ждёт результат его пачки."""
+        if not user_text or not user_text.strip():
+            raise ValueError("Текст для парсинга пустой")
+
+        # Попадание в кэш не должно ждать окна склейки.
+        cached = self._ai_service.get_cached_parse(user_text, preferred_categories)
+        if cached is not None:
+            return cached
+
+        future = asyncio.get_running_loop().create_future()
+        self._batcher.add((user_text, preferred_categories, future))
+        # shield: отмена хендлера не должна отменять разбор чужих сообщений пачки.
+        return await asyncio.shield(future)
+
+    async def close(self) -> None:
+        """Разбирает всё, что осталось в очереди (вызывать при остановке бота)."""
+        await self._batcher.close()
+
+    async def _flush(self, batch: List[_PendingParse]) -> None:
+        if len(batch) == 1:
+            await self._parse_single(batch[0])
+            return
+
+        try:
+            results = await self._ai_service.parse_transaction_batch(
+                [(text, categories) for text, categories, _ in batch]
+            )
+        except ValueError as exc:
+            logger.warning(
+                "Пакетный ответ не разобран (%s), разбираем %d сообщений по одному",
+                exc,
+                len(batch),
+            )
+            results = [None] * len(batch)
+        except Exception as exc:  # noqa: BLE001
+            # AICODE-NOTE: Сетевые ошибки и 429 уже исчерпали повторы llm_retry;
+            # N одиночных запросов к тому же провайдеру лишь умножат нагрузку.
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        # AICODE-NOTE: Одно непонятое сообщение не должно ронять всю пачку —
+        # всё, что модель не вернула, разбираем обычным одиночным запросом.
+        retry = []
+        for item, dto in zip(batch, results):
+            if dto is None:
+                retry.append(self._parse_single(item))
+            elif not item[2].done():
+                item[2].set_result(dto)
+        if retry:
+            await asyncio.gather(*retry)
+
+    async def _parse_single(self, item: _PendingParse) -> None:
+        text, categories, future = item
+        try:
+            dto = await self._ai_service.parse_transaction_text(text, categories)
+        except Exception as exc:  # noqa: BLE001
+            if not future.done():
+                future.set_exception(exc)
+        else:
+            if not future.done():
+                future.set_result(dto)
@@ -1,18 +1,22 @@
 from __future__ import annotations
 
 import logging
+import math
 from dataclasses import dataclass
 from datetime import date, timedelta
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
-from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.models import Transaction
+from database.models import Category
+from database.repositories.category import CategoryRepository
 from database.repositories.transaction import TransactionRepository
 
 logger = logging.getLogger(__name__)
 
+# Верхняя граница суммы одной траты: 10 млрд рублей в копейках.
+MAX_AMOUNT_KOPECKS = 10**12
+
 
 @dataclass
 class TransactionInput:
@@ -30,15 +34,45 @@ class WeeklyCategoryStat:
     """DTO для статистики по категориям за неделю."""
 
     category: str
-    total: float
+    total: int  # в копейках
+
+
+def format_amount(amount_kopecks: int) -> str:
+    """Форматирует сумму в копейках как рубли: 150050 -> "1500.50"."""
+    return f"{amount_kopecks // 100}.{amount_kopecks % 100:02d}"
+
+
+def _find_first_trigger_match(
+    categories: List[Category], normalized_text: str
+) -> Optional[Category]:
+    # Самая ранняя категория пользователя, чей триггер встречается в тексте.
+    for category in categories:
+        if category.match_text_lc in normalized_text:
+            return category
+    return None
 
 
 class FinanceService:
     """Сервис бизнес-логики финансовых операций."""
 
+    __slots__ = ("session", "transaction_repo", "category_repo")
+
     def __init__(self, session: AsyncSession):
         self.session = session
         self.transaction_repo = TransactionRepository(session)
+        self.category_repo = CategoryRepository(session)
+
+    @staticmethod
+    def _normalize_amount(amount: float) -> int:
+        """Переводит сумму в рублях в целые копейки и проверяет границы."""
+        amount = float(amount)
+        if not math.isfinite(amount):
+            raise ValueError("Сумма должна быть числом")
+        # round() после умножения гасит артефакты float: 0.29 * 100 = 28.999...
+        amount_kopecks = int(round(amount * 100))
+        if not 0 < amount_kopecks <= MAX_AMOUNT_KOPECKS:
+            raise ValueError("Сумма должна быть положительной и не слишком большой")
+        return amount_kopecks
 
     @staticmethod
     def _normalize_category(category: str) -> str:
@@ -50,23 +84,87 @@ class FinanceService:
     def _normalize_date(spend_date: Optional[date]) -> date:
         return spend_date or date.today()
 
-    async def add_transaction(self, data: TransactionInput) -> Transaction:
-        if data.user_id <= 0:
+    @staticmethod
+    def _validate_user_id(user_id: int) -> None:
+        if user_id <= 0:
             raise ValueError("user_id должен быть положительным")
 
-        amount = data.amount
-        category = self._normalize_category(data.category)
-        spend_date = self._normalize_date(data.spend_date)
+    async def list_categories(self, user_id: int) -> List[Category]:
+        self._validate_user_id(user_id)
+        return await self.category_repo.list_by_user(user_id)
+
+    async def create_category(
+        self, user_id: int, name: str, match_text: str
+    ) -> Category:
+        self._validate_user_id(user_id)
+        name = self._normalize_category(name)
+        if not match_text or not match_text.strip():
+            raise ValueError("Фраза-триггер не может быть пустой")
+        match_text = match_text.strip()
+
+        if await self.category_repo.get_by_name_ci(user_id, name):
+            raise ValueError(f"категория «{name}» уже существует")
+        existing = await self.category_repo.get_by_match_text_ci(user_id, match_text)
+        if existing:
+            raise ValueError(
+                f"фраза «{match_text}» уже привязана к категории «{existing.name}»"
+            )
+
+        return await self.category_repo.create(
+            user_id=user_id, name=name, match_text=match_text
+        )
+
+    @staticmethod
+    def _row_for(
+        data: TransactionInput, matched_category: Optional[Category]
+    ) -> Dict[str, Any]:
+        FinanceService._validate_user_id(data.user_id)
+        amount_kopecks = FinanceService._normalize_amount(data.amount)
+        category = FinanceService._normalize_category(data.category)
+        if matched_category:
+            category = matched_category.name
+        spend_date = FinanceService._normalize_date(data.spend_date)
 
         # AICODE-NOTE: Валюта не хранится — предполагаем единую (RUB) для MVP.
-        transaction = await self.transaction_repo.create(
+        return TransactionRepository.build_row(
             user_id=data.user_id,
-            amount=amount,
+            amount_kopecks=amount_kopecks,
             category=category,
             raw_text=data.raw_text,
             spend_date=spend_date,
         )
-        return transaction
+
+    @staticmethod
+    def build_transaction_row(
+        data: TransactionInput, user_categories: List[Category]
+    ) -> Dict[str, Any]:
+        """
+        Валидирует ввод и возвращает значения колонок будущей транзакции
+        (сумма уже в копейках). Если в raw_text встречается фраза-триггер одной
+        из категорий пользователя, категория берётся из неё, а не из ответа LLM.
+
+        Синхронно и без сессии: категории уже загружены вызывающим кодом
+        (хендлеру они нужны и для подсказки LLM).
+        """
+        matched_category = (
+            _find_first_trigger_match(user_categories, data.raw_text.lower())
+            if data.raw_text
+            else None
+        )
+        return FinanceService._row_for(data, matched_category)
+
+    async def prepare_transaction(self, data: TransactionInput) -> Dict[str, Any]:
+        """
+        То же, что build_transaction_row, для вызывающих без загруженных
+        категорий: триггер ищется одним запросом в БД.
+        """
+        self._validate_user_id(data.user_id)
+        matched_category = (
+            await self.category_repo.find_match_for_text(data.user_id, data.raw_text)
+            if data.raw_text
+            else None
+        )
+        return self._row_for(data, matched_category)
 
     async def get_week_stats(
         self, user_id: int, base_date: Optional[date] = None
@@ -74,28 +172,14 @@ class FinanceService:
         """
         Возвращает статистику по категориям за последние 7 дней (включая base_date).
         """
-        if user_id <= 0:
-            raise ValueError("user_id должен быть положительным")
+        self._validate_user_id(user_id)
 
         end_date = base_date or date.today()
         start_date = end_date - timedelta(days=6)
 
-        stmt = (
-            select(
-                Transaction.category,
-                func.sum(Transaction.amount).label("total_amount"),
-            )
-            .where(
-                Transaction.user_id == user_id,
-                Transaction.date >= start_date,
-                Transaction.date <= end_date,
-            )
-            .group_by(Transaction.category)
-            .order_by(func.sum(Transaction.amount).desc())
+        rows = await self.transaction_repo.sum_by_category(
+            user_id, start_date, end_date
         )
-
-        result = await self.session.execute(stmt)
-        rows = result.all()
         return [
             WeeklyCategoryStat(category=row.category, total=row.total_amount)
             for row in rows
@@ -1,18 +1,37 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
 
-from openai import AsyncOpenAI, OpenAIError
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAIError,
+    RateLimitError,
+)
+from opentelemetry import trace
 from pydantic import SecretStr
-from langchain_deepseek import ChatDeepSeek
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from tenacity import (
+    RetryCallState,
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
 from core.config import settings
+from core.http import get_shared_http_client
 
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from langchain_deepseek import ChatDeepSeek
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -41,20 +60,179 @@ def _resolve_provider() -> tuple[str, str, Optional[str]]:
 
 _provider, _api_key, _base_url = _resolve_provider()
 _openai_client: Optional[AsyncOpenAI] = None
+_deepseek_client: Optional[ChatDeepSeek] = None
 
 
 def _get_openai_client() -> AsyncOpenAI:
     """Ленивая инициализация AsyncOpenAI для OpenAI-совместимых API."""
     global _openai_client
     if _openai_client is None:
-        _openai_client = AsyncOpenAI(api_key=_api_key, base_url=_base_url)
+        _openai_client = AsyncOpenAI(
+            api_key=_api_key,
+            base_url=_base_url,
+            http_client=get_shared_http_client(),
+            max_retries=0,  # Повторы делает llm_retry, см. ниже.
+        )
     return _openai_client
 
 
+def _get_deepseek_client() -> ChatDeepSeek:
+    """Ленивая инициализация ChatDeepSeek (один клиент на процесс)."""
+    global _deepseek_client
+    if _deepseek_client is None:
+        # AICODE-NOTE: langchain тянет сотни модулей, поэтому импортируем его
+        # только когда провайдер действительно DeepSeek.
+        from langchain_deepseek import ChatDeepSeek
+
+        _deepseek_client = ChatDeepSeek(
+            model="deepseek-chat",
+            api_key=_api_key,
+            temperature=0,
+            max_tokens=None,
+            timeout=None,
+            max_retries=0,
+            # Тот же пул соединений, что и у AsyncOpenAI (keep-alive, HTTP/2).
+            http_async_client=get_shared_http_client(),
+        )
+    return _deepseek_client
+
+
+# AICODE-NOTE: Единая политика повторов для LLM и Whisper. Встроенные ретраи
+# SDK (max_retries) отключены, иначе попытки перемножаются. Повторяется вся
+# попытка целиком, а слот семафора берётся внутри неё — на время паузы между
+# попытками слот свободен.
+RETRYABLE_ERRORS = (
+    RateLimitError,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+)
+LLM_MAX_ATTEMPTS = 5
+RETRY_AFTER_MAX_SECONDS = 60.0
+
+_backoff = wait_random_exponential(min=1, max=30)
+
+
+def _retry_after_seconds(exc: Optional[BaseException]) -> Optional[float]:
+    if not isinstance(exc, RateLimitError):
+        return None
+    headers = exc.response.headers
+    for header, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return min(float(value) / scale, RETRY_AFTER_MAX_SECONDS)
+        except ValueError:
+            continue  # retry-after в формате HTTP-date — берём backoff
+    return None
+
+
+def _wait_retry_after_or_backoff(retry_state: RetryCallState) -> float:
+    """
+    429 с retry-after ждём столько, сколько просит провайдер; иначе backoff
+    с jitter.
+    """
+    retry_after = _retry_after_seconds(retry_state.outcome.exception())
+    return retry_after if retry_after is not None else _backoff(retry_state)
+
+
+def _record_retry(retry_state: RetryCallState) -> None:
+    exc = retry_state.outcome.exception()
+    logger.warning(
+        "Временная ошибка провайдера (%s), попытка %d из %d",
+        exc,
+        retry_state.attempt_number,
+        LLM_MAX_ATTEMPTS,
+    )
+    span = trace.get_current_span()
+    span.set_attribute("llm.retry_count", retry_state.attempt_number)
+
+
+llm_retry = retry(
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    wait=_wait_retry_after_or_backoff,
+    stop=stop_after_attempt(LLM_MAX_ATTEMPTS),
+    before_sleep=_record_retry,
+    reraise=True,
+)
+
+
+class TokenBucket:
+    """
+    Проактивный ограничитель запросов/токенов в минуту: ждём сами, вместо того
+    чтобы ловить 429 от провайдера и платить за backoff.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self._request_capacity = float(rpm)
+        self._token_capacity = float(tpm)
+        self._requests = self._request_capacity
+        self._tokens = self._token_capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed_minutes = (now - self._updated_at) / 60
+        self._updated_at = now
+        self._requests = min(
+            self._request_capacity,
+            self._requests + elapsed_minutes * self._request_capacity,
+        )
+        self._tokens = min(
+            self._token_capacity,
+            self._tokens + elapsed_minutes * self._token_capacity,
+        )
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        # Запрос больше всего бюджета всё равно должен пройти, когда бюджет полон.
+        needed_tokens = min(float(estimated_tokens), self._token_capacity)
+        # Лок держит очередь честной: следующий ждёт, пока пройдёт предыдущий.
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= needed_tokens:
+                    self._requests -= 1
+                    self._tokens -= needed_tokens
+                    return
+                wait_minutes = max(
+                    (1 - self._requests) / self._request_capacity,
+                    (needed_tokens - self._tokens) / self._token_capacity,
+                )
+                await asyncio.sleep(wait_minutes * 60)
+
+
+_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+_bucket = TokenBucket(rpm=settings.LLM_RPM, tpm=settings.LLM_TPM)
+
+
+def _estimate_tokens(messages: List[Dict[str, str]], max_tokens: Optional[int]) -> int:
+    # Грубая оценка (~4 символа на токен) — точный токенайзер тут не нужен.
+    return len(str(messages)) // 4 + (max_tokens or 0)
+
+
+@asynccontextmanager
+async def _llm_slot(estimated_tokens: int) -> AsyncIterator[None]:
+    """Ограничивает число одновременных запросов к LLM и их темп (RPM/TPM)."""
+    async with _semaphore:
+        await _bucket.acquire(estimated_tokens)
+        yield
+
+
+def _record_cached_tokens(response: Any) -> None:
+    """Пишет в текущий span, сколько токенов промпта провайдер взял из кэша."""
+    details = getattr(getattr(response, "usage", None), "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None)
+    if cached_tokens is not None:
+        trace.get_current_span().set_attribute(
+            "llm.token_count.prompt_details.cache_read", cached_tokens
+        )
+
+
 def _to_lc_messages(messages: List[Dict[str, str]]):
     """Конвертируем сообщения в формат LangChain."""
-    if not ChatOpenAI or not SystemMessage or not HumanMessage or not AIMessage:
-        raise ImportError("langchain-openai и langchain-core нужны для langchain_deepseek провайдера")
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
     role_map = {
         "system": SystemMessage,
@@ -67,6 +245,23 @@ def _to_lc_messages(messages: List[Dict[str, str]]):
         raise ValueError("Некорректный формат сообщений для LLM") from exc
 
 
+@llm_retry
+async def _create_chat_completion(estimated_tokens: int, **kwargs: Any) -> Any:
+    async with _llm_slot(estimated_tokens):
+        return await _get_openai_client().chat.completions.create(**kwargs)
+
+
+@llm_retry
+async def _invoke_deepseek(
+    deepseek: ChatDeepSeek,
+    lc_messages,
+    estimated_tokens: int,
+    **kwargs: Any,
+) -> Any:
+    async with _llm_slot(estimated_tokens):
+        return await deepseek.ainvoke(lc_messages, **kwargs)
+
+
 async def generate_chat_response(
     messages: List[Dict[str, str]],
     *,
@@ -74,6 +269,7 @@ async def generate_chat_response(
     response_format: Optional[Dict[str, Any]] = None,
     temperature: float = 0.2,
     max_tokens: Optional[int] = None,
+    stop: Optional[List[str]] = None,
 ) -> str:
     """
     Делает вызов LLM и возвращает только текст ответа.
@@ -81,34 +277,38 @@ async def generate_chat_response(
     messages: список словарей с ключами role/content, совместимыми с OpenAI API.
     """
     model_name = model or settings.AI_MODEL
+    estimated_tokens = _estimate_tokens(messages, max_tokens)
 
     if _provider == "deepseek":
         lc_messages = _to_lc_messages(messages)
-        deepseek = ChatDeepSeek(
-            model="deepseek-chat",
-            temperature=0,
-            max_tokens=None,
-            timeout=None,
-            max_retries=2,
-        )
+        deepseek = _get_deepseek_client()
         try:
-            response = await deepseek.ainvoke(lc_messages)
+            # max_tokens/stop уходят в payload запроса, как и у OpenAI.
+            invoke_kwargs: Dict[str, Any] = {"stop": stop}
+            if max_tokens is not None:
+                invoke_kwargs["max_tokens"] = max_tokens
+            response = await _invoke_deepseek(
+                deepseek, lc_messages, estimated_tokens, **invoke_kwargs
+            )
         except Exception as exc:
             logger.exception("Ошибка вызова langchain_deepseek: %s", exc)
             raise
         content = getattr(response, "content", None)
     else:
         try:
-            response = await _get_openai_client().chat.completions.create(
+            response = await _create_chat_completion(
+                estimated_tokens,
                 model=model_name,
                 messages=messages,
                 response_format=response_format,
                 temperature=temperature,
                 max_tokens=max_tokens,
+                stop=stop,
             )
         except OpenAIError as exc:
             logger.exception("Ошибка вызова OpenAI: %s", exc)
             raise
+        _record_cached_tokens(response)
         content = response.choices[0].message.content if response.choices else None
 
     if not content:
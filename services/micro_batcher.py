@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Generic, List, Optional, Set, TypeVar
+
+T = TypeVar("T")
+
+
+class MicroBatcher(Generic[T]):
+    """
+    Копит элементы в течение короткого окна и отдаёт их пачкой в flush:
+    по истечении window секунд от первого элемента или сразу, как только
+    набралось max_size. Результаты элементов (futures) ведёт сам flush.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[T]], Awaitable[None]],
+        window: float,
+        max_size: int,
+    ):
+        self._flush = flush
+        self._window = window
+        self._max_size = max_size
+        self._pending: List[T] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add(self, item: T) -> None:
+        self._pending.append(item)
+        if len(self._pending) >= self._max_size:
+            self._spawn(self._flush(self._take_pending()))
+        elif self._timer is None:
+            self._timer = self._spawn(self._flush_after_delay())
+
+    async def close(self) -> None:
+        """Сбрасывает очередь, не дожидаясь окна, и ждёт запущенные пачки."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        batch = self._take_pending()
+        if batch:
+            await self._flush(batch)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _take_pending(self) -> List[T]:
+        batch, self._pending = self._pending, []
+        return batch
+
+    async def _flush_after_delay(self) -> None:
+        await asyncio.sleep(self._window)
+        self._timer = None
+        batch = self._take_pending()
+        if batch:
+            await self._flush(batch)
@@ -1,14 +1,42 @@
-SYSTEM_PROMPT = """
+# AICODE-NOTE: Промпт разбит на неизменный префикс и короткий переменный хвост:
+# всё, что меняется (дата, категории пользователя), идёт отдельным сообщением
+# после SYSTEM_PROMPT_STATIC, и префикс собирается один раз при импорте.
+# Формулировки нейтральны к числу сообщений: тот же префикс используют
+# одиночный разбор и пакетный (BATCH_PROMPT_SUFFIX).
+# Кэш промптов OpenAI включается от 1024 токенов; префикс намного короче,
+# так что экономии на кэше сейчас нет.
+SYSTEM_PROMPT_STATIC = """
 Ты помощник по структурированию финансовых транзакций.
-Тебе приходит одно короткое сообщение пользователя (обычно на русском).
-Нужно вернуть строго один объект JSON с полями:
+Тебе приходят короткие сообщения пользователя (обычно на русском).
+Для каждого сообщения нужно вернуть объект JSON с полями:
 - "amount": положительное число (сумма траты, без валюты),
 - "category": краткое название категории (существительное, например "Еда", "Транспорт"),
 - "date": дата операции в формате YYYY-MM-DD.
-Если дата не указана — используй сегодняшнюю: {today_date}.
-{categories_hint}
-Без текста до или после JSON. Никаких комментариев, только объект.
+Без текста до или после JSON. Никаких комментариев, только JSON.
+"""
 
+# Шаблоны string.Template ($-подстановки): фигурные скобки JSON в тексте
+# не нужно экранировать.
+SCHEMA_PROMPT = """
 Заполни схему и в ответе верни только JSON:
-{transaction_schema}
-"""
\ No newline at end of file
+$transaction_schema
+"""
+
+# Переменный хвост: отдельное system-сообщение после статического префикса.
+SYSTEM_PROMPT_SUFFIX = """
+Если дата не указана — используй сегодняшнюю: $today_date.
+$categories_hint
+"""
+
+BATCH_CATEGORIES_HINT = """
+Если описание совпадает с одной из категорий из поля "categories" того же сообщения,
+выбери её. Если не подходит ни одна, предложи краткую новую категорию.
+"""
+
+BATCH_PROMPT_SUFFIX = """
+Сейчас сообщений несколько. На вход приходит JSON-массив объектов
+{"id": <число>, "text": <сообщение>, "categories": [<категории пользователя>]}.
+Разбери каждое сообщение отдельно по правилам выше и верни один объект JSON
+{"results": [...]}, где на каждый входной объект ровно один объект с тем же "id"
+и полями "amount", "category", "date".
+"""
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, AsyncContextManager, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.repositories.transaction import TransactionRepository
+from services.micro_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+SessionFactory = Callable[[], AsyncContextManager[AsyncSession]]
+_PendingRow = Tuple[Dict[str, Any], asyncio.Future]
+
+
+class TransactionBatchWriter:
+    """
+    Склеивает вставки транзакций, пришедшие в течение короткого окна, в один
+    executemany INSERT и один COMMIT (вместо COMMIT на каждое сообщение).
+    """
+
+    def __init__(
+        self,
+        session_factory: SessionFactory,
+        flush_delay: float = 0.05,
+        max_batch_size: int = 100,
+    ):
+        self._session_factory = session_factory
+        self._batcher: MicroBatcher[_PendingRow] = MicroBatcher(
+            self._flush, window=flush_delay, max_size=max_batch_size
+        )
+
+    async def submit(self, row: Dict[str, Any]) -> None:
+        """
+        Ставит строку (из FinanceService.build_transaction_row) в очередь и ждёт,
+        пока её пачка будет закоммичена. Ошибка записи пробрасывается вызывающему.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._batcher.add((row, future))
+        # shield: отмена хендлера не должна отменять запись чужих строк пачки.
+        await asyncio.shield(future)
+
+    async def close(self) -> None:
+        """Дописывает всё, что осталось в очереди (вызывать при остановке бота)."""
+        await self._batcher.close()
+
+    async def _flush(self, batch: List[_PendingRow]) -> None:
+        try:
+            await self._insert([row for row, _ in batch])
+        except Exception as exc:  # noqa: BLE001
+            if len(batch) == 1:
+                self._resolve(batch, exc)
+                return
+            # AICODE-NOTE: Одна битая строка не должна ронять всю пачку —
+            # при ошибке повторяем вставку построчно.
+            logger.warning(
+                "Пакетная вставка %d транзакций не удалась (%s), пишем по одной",
+                len(batch),
+                exc,
+            )
+            for item in batch:
+                try:
+                    await self._insert([item[0]])
+                except Exception as row_exc:  # noqa: BLE001
+                    self._resolve([item], row_exc)
+                else:
+                    self._resolve([item])
+        else:
+            self._resolve(batch)
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        async with self._session_factory() as session, session.begin():
+            await TransactionRepository(session).create_many(rows)
+
+    @staticmethod
+    def _resolve(
+        batch: List[_PendingRow],
+        exc: Optional[BaseException] = None,
+    ) -> None:
+        for _, future in batch:
+            if future.done():
+                continue
+            if exc is None:
+                future.set_result(None)
+            else:
+                future.set_exception(exc)
@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# Settings читаются при импорте core.config: тестовые значения должны быть в
+# окружении раньше, чем тесты импортируют модули бота. БД — временный файл.
+_TMP_DIR = tempfile.mkdtemp(prefix="finance_bot_tests_")
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["DB_NAME"] = os.path.join(_TMP_DIR, "test.sqlite")
+os.environ.pop("DATABASE_URL", None)
+os.environ["ENABLE_TRACING"] = "false"
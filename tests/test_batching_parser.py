@@ -0,0 +1,140 @@
+import asyncio
+
+import httpx
+import openai
+import orjson
+import pytest
+
+import services.ai_service as ai_service_module
+from services.ai_service import AIService, BatchingParser
+
+TODAY = "2026-01-15"
+
+
+def _result(index, amount, category="Еда"):
+    return {"id": index, "amount": amount, "category": category, "date": TODAY}
+
+
+class _FakeLLM:
+    """
+    Подменяет generate_chat_response. Пакетный запрос узнаётся по JSON-массиву
+    в user-сообщении; одиночный отвечает суммой из текста вида "t<число>".
+    """
+
+    def __init__(self, batch_reply):
+        self.batch_reply = batch_reply
+        self.batch_payloads = []
+        self.single_texts = []
+
+    async def __call__(self, messages, **kwargs):
+        content = messages[-1]["content"]
+        if content.startswith("["):
+            self.batch_payloads.append(orjson.loads(content))
+            if isinstance(self.batch_reply, BaseException):
+                raise self.batch_reply
+            return self.batch_reply
+        self.single_texts.append(content)
+        amount = int(content.removeprefix("t"))
+        return orjson.dumps(_result(0, amount, "Одиночный")).decode()
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    def install(batch_reply):
+        fake = _FakeLLM(batch_reply)
+        monkeypatch.setattr(ai_service_module, "generate_chat_response", fake)
+        return fake
+
+    return install
+
+
+def _submit_all(parser, texts):
+    return asyncio.gather(
+        *(parser.submit(text) for text in texts), return_exceptions=True
+    )
+
+
+def test_results_are_matched_by_id(fake_llm):
+    # Порядок перепутан, id=1 нет, id=0 повторяется, id=7 вне диапазона.
+    fake = fake_llm(
+        orjson.dumps(
+            {
+                "results": [
+                    _result(2, 30),
+                    _result(0, 10),
+                    _result(0, 999),
+                    _result(7, 70),
+                    {"id": "1", "amount": 5},
+                ]
+            }
+        ).decode()
+    )
+
+    async def scenario():
+        parser = BatchingParser(AIService(), max_delay_ms=10)
+        return await _submit_all(parser, ["t10", "t20", "t30"])
+
+    first, second, third = asyncio.run(scenario())
+
+    assert len(fake.batch_payloads) == 1
+    assert [item["id"] for item in fake.batch_payloads[0]] == [0, 1, 2]
+    # Первый объект с id побеждает, дубликат игнорируется.
+    assert (first.amount, first.category) == (10, "Еда")
+    assert (third.amount, third.category) == (30, "Еда")
+    # Пропущенное сообщение разобрано отдельным запросом.
+    assert (second.amount, second.category) == (20, "Одиночный")
+    assert fake.single_texts == ["t20"]
+    assert [dto.raw_text for dto in (first, second, third)] == ["t10", "t20", "t30"]
+
+
+@pytest.mark.parametrize(
+    "reply",
+    ["not json", '{"items": []}', '{"results": {"id": 0}}'],
+    ids=["bad-json", "no-results", "results-not-list"],
+)
+def test_malformed_batch_falls_back_to_single_parses(fake_llm, reply):
+    fake = fake_llm(reply)
+
+    async def scenario():
+        parser = BatchingParser(AIService(), max_delay_ms=10)
+        return await _submit_all(parser, ["t1", "t2", "t3"])
+
+    results = asyncio.run(scenario())
+
+    assert [dto.amount for dto in results] == [1, 2, 3]
+    assert sorted(fake.single_texts) == ["t1", "t2", "t3"]
+
+
+def test_provider_error_reaches_every_waiter(fake_llm):
+    error = openai.APIConnectionError(
+        request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    )
+    fake = fake_llm(error)
+
+    async def scenario():
+        parser = BatchingParser(AIService(), max_delay_ms=10)
+        return await _submit_all(parser, ["t1", "t2", "t3"])
+
+    results = asyncio.run(scenario())
+
+    assert all(result is error for result in results)
+    assert fake.single_texts == []
+
+
+def test_close_drains_pending_submissions(fake_llm):
+    fake = fake_llm(
+        orjson.dumps({"results": [_result(0, 1), _result(1, 2)]}).decode()
+    )
+
+    async def scenario():
+        parser = BatchingParser(AIService(), max_delay_ms=10_000)
+        tasks = [asyncio.create_task(parser.submit(text)) for text in ("t1", "t2")]
+        await asyncio.sleep(0)
+        assert fake.batch_payloads == []
+        # close() не ждёт окно склейки: ответы приходят сразу.
+        await asyncio.wait_for(parser.close(), timeout=1)
+        return await asyncio.wait_for(asyncio.gather(*tasks), timeout=1)
+
+    results = asyncio.run(scenario())
+
+    assert [dto.amount for dto in results] == [1, 2]
@@ -0,0 +1,112 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+import services.llm as llm
+from services.llm import LLM_MAX_ATTEMPTS, _retry_after_seconds, llm_retry
+
+_REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def _rate_limit_error(headers):
+    response = httpx.Response(429, headers=headers, request=_REQUEST)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # tenacity берёт asyncio.sleep в момент паузы, поэтому подмена работает.
+    recorded = []
+
+    async def fake_sleep(seconds):
+        recorded.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    return recorded
+
+
+@pytest.mark.parametrize(
+    ("headers", "expected"),
+    [
+        ({"retry-after": "2"}, 2.0),
+        ({"retry-after-ms": "1500"}, 1.5),
+        ({"retry-after-ms": "1500", "retry-after": "2"}, 1.5),
+        ({"retry-after": "120"}, llm.RETRY_AFTER_MAX_SECONDS),
+        ({"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"}, None),
+        ({"retry-after-ms": "soon", "retry-after": "3"}, 3.0),
+        ({}, None),
+    ],
+    ids=[
+        "seconds",
+        "milliseconds",
+        "ms-wins",
+        "capped",
+        "http-date",
+        "bad-ms-falls-back",
+        "no-header",
+    ],
+)
+def test_retry_after_seconds(headers, expected):
+    assert _retry_after_seconds(_rate_limit_error(headers)) == expected
+
+
+def test_retry_after_ignores_other_errors():
+    assert _retry_after_seconds(openai.APIConnectionError(request=_REQUEST)) is None
+    assert _retry_after_seconds(None) is None
+
+
+class _Flaky:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def _run_with_retry(flaky):
+    return asyncio.run(llm_retry(flaky)())
+
+
+def test_waits_as_long_as_retry_after_asks(sleeps):
+    flaky = _Flaky([_rate_limit_error({"retry-after": "2"})] * 2)
+
+    assert _run_with_retry(flaky) == "ok"
+    assert flaky.calls == 3
+    assert sleeps == [2.0, 2.0]
+
+
+def test_stops_after_max_attempts(sleeps):
+    error = _rate_limit_error({"retry-after-ms": "250"})
+    flaky = _Flaky([error] * (LLM_MAX_ATTEMPTS + 1))
+
+    with pytest.raises(openai.RateLimitError) as raised:
+        _run_with_retry(flaky)
+
+    assert raised.value is error
+    assert flaky.calls == LLM_MAX_ATTEMPTS
+    assert sleeps == [0.25] * (LLM_MAX_ATTEMPTS - 1)
+
+
+def test_backoff_without_retry_after(sleeps):
+    flaky = _Flaky([openai.APIConnectionError(request=_REQUEST)])
+
+    assert _run_with_retry(flaky) == "ok"
+    assert flaky.calls == 2
+    assert len(sleeps) == 1
+    assert 1 <= sleeps[0] <= 30
+
+
+def test_non_retryable_error_is_not_retried(sleeps):
+    flaky = _Flaky([ValueError("bad request")])
+
+    with pytest.raises(ValueError):
+        _run_with_retry(flaky)
+
+    assert flaky.calls == 1
+    assert sleeps == []
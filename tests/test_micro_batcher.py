@@ -0,0 +1,62 @@
+import asyncio
+
+from services.micro_batcher import MicroBatcher
+
+
+class _Recorder:
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, batch):
+        self.batches.append(list(batch))
+
+
+def test_flushes_after_window():
+    async def scenario():
+        flush = _Recorder()
+        batcher = MicroBatcher(flush, window=0.02, max_size=10)
+        batcher.add(1)
+        batcher.add(2)
+        await asyncio.sleep(0)
+        assert flush.batches == []
+
+        await asyncio.sleep(0.05)
+        assert flush.batches == [[1, 2]]
+
+        # Следующий элемент открывает новое окно.
+        batcher.add(3)
+        await asyncio.sleep(0.05)
+        assert flush.batches == [[1, 2], [3]]
+
+    asyncio.run(scenario())
+
+
+def test_flushes_immediately_on_max_size():
+    async def scenario():
+        flush = _Recorder()
+        batcher = MicroBatcher(flush, window=0.05, max_size=3)
+        for item in range(4):
+            batcher.add(item)
+        await asyncio.sleep(0)
+        assert flush.batches == [[0, 1, 2]]
+
+        await batcher.close()
+        assert flush.batches == [[0, 1, 2], [3]]
+
+    asyncio.run(scenario())
+
+
+def test_close_drains_pending_items():
+    async def scenario():
+        flush = _Recorder()
+        batcher = MicroBatcher(flush, window=0.01, max_size=10)
+        batcher.add("a")
+        batcher.add("b")
+        await batcher.close()
+        assert flush.batches == [["a", "b"]]
+
+        # Пустая очередь не вызывает flush.
+        await batcher.close()
+        assert flush.batches == [["a", "b"]]
+
+    asyncio.run(scenario())
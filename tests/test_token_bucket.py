@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import services.llm as llm
+from services.llm import TokenBucket
+
+
+class _FakeClock:
+    """
+    Подменяет time.monotonic и asyncio.sleep: sleep записывает паузу и двигает
+    часы вперёд, но отдаёт управление циклу сразу.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+        self._real_sleep = asyncio.sleep
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await self._real_sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = _FakeClock()
+    monkeypatch.setattr(llm.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(asyncio, "sleep", fake.sleep)
+    return fake
+
+
+def _acquire_all(bucket, *estimates):
+    async def scenario():
+        for estimated_tokens in estimates:
+            await bucket.acquire(estimated_tokens)
+
+    asyncio.run(scenario())
+
+
+def test_full_bucket_does_not_wait(clock):
+    _acquire_all(TokenBucket(rpm=60, tpm=600), 100, 200, 300)
+
+    assert clock.sleeps == []
+
+
+def test_waits_for_missing_tokens(clock):
+    # 300 токенов при 600 в минуту восполняются за 30 секунд.
+    _acquire_all(TokenBucket(rpm=60, tpm=600), 600, 300)
+
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+
+def test_waits_for_request_budget(clock):
+    _acquire_all(TokenBucket(rpm=1, tpm=10_000), 10, 10)
+
+    assert clock.sleeps == [pytest.approx(60.0)]
+
+
+def test_request_above_budget_is_clamped(clock):
+    bucket = TokenBucket(rpm=10, tpm=100)
+    # Запрос больше минутного бюджета проходит по полному ведру и опустошает
+    # его, а не ждёт вечно.
+    _acquire_all(bucket, 500)
+    assert clock.sleeps == []
+
+    # Один токен при 100 в минуту — это 0.6 секунды.
+    _acquire_all(bucket, 1)
+    assert clock.sleeps == [pytest.approx(0.6)]
+
+
+def test_refill_after_idle_time(clock):
+    bucket = TokenBucket(rpm=60, tpm=600)
+    _acquire_all(bucket, 600)
+
+    clock.now += 60
+    _acquire_all(bucket, 600)
+
+    assert clock.sleeps == []
+
+
+def test_llm_slot_limits_concurrency_and_rate(clock, monkeypatch):
+    monkeypatch.setattr(llm, "_semaphore", asyncio.Semaphore(1))
+    monkeypatch.setattr(llm, "_bucket", TokenBucket(rpm=60, tpm=600))
+    events = []
+
+    async def call(name):
+        async with llm._llm_slot(300):
+            events.append(f"{name} in")
+            await asyncio.sleep(0)
+            events.append(f"{name} out")
+
+    async def scenario():
+        await asyncio.gather(call("a"), call("b"), call("c"))
+
+    asyncio.run(scenario())
+
+    # Семафор на одно место: вызовы не пересекаются.
+    assert events == ["a in", "a out", "b in", "b out", "c in", "c out"]
+    # Третьему не хватает 300 токенов: 30 секунд ожидания в ведре.
+    assert [s for s in clock.sleeps if s] == [pytest.approx(30.0)]
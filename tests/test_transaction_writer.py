@@ -0,0 +1,54 @@
+import asyncio
+from datetime import date
+
+from sqlalchemy.exc import IntegrityError
+
+import database.models  # noqa: F401  # регистрирует таблицы в Base.metadata
+from database.base import Base
+from database.repositories.transaction import TransactionRepository
+from database.repositories.user import UserRepository
+from database.session import engine, get_session
+from services.transaction_writer import TransactionBatchWriter
+
+MISSING_USER_ID = 999
+
+
+def _row(user_id, amount_kopecks):
+    return TransactionRepository.build_row(
+        user_id=user_id,
+        amount_kopecks=amount_kopecks,
+        category="Еда",
+        raw_text=None,
+        spend_date=date(2026, 1, 15),
+    )
+
+
+def test_bad_row_fails_alone_and_good_row_is_committed(caplog):
+    async def scenario():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        async with get_session() as session, session.begin():
+            user_id = await UserRepository(session).get_or_create_id(7)
+
+        writer = TransactionBatchWriter(get_session, flush_delay=0.01)
+        # Обе строки попадают в одно окно: пачка падает на внешнем ключе,
+        # и writer повторяет вставку построчно.
+        good, bad = await asyncio.gather(
+            writer.submit(_row(user_id, 12_345)),
+            writer.submit(_row(MISSING_USER_ID, 100)),
+            return_exceptions=True,
+        )
+        await writer.close()
+
+        async with get_session() as session:
+            stored = await TransactionRepository(session).list_for_user(user_id)
+        await engine.dispose()
+        return good, bad, stored
+
+    good, bad, stored = asyncio.run(scenario())
+
+    assert "Пакетная вставка 2 транзакций не удалась" in caplog.text
+    assert good is None
+    assert isinstance(bad, IntegrityError)
+    assert [row.amount for row in stored] == [12_345]